@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Benchmarks dos scripts sobre um repositório sintético de questões.
+# o pandoc é trocado por um executável local, então os tempos medem só o nosso código.
+# Os resultados vão para json e podem ser comparados com uma execução anterior.
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+import mbuild
+import mdpp
+from filter import Filter
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+class Synthetic:
+    words = ["vetor", "matriz", "laço", "função", "ponteiro", "lista", "pilha", "fila", "grafo", "string"]
+
+    def __init__(self, seed: int, sections: int, lines: int):
+        self.random = random.Random(seed)
+        self.sections = sections
+        self.lines = lines
+
+    def sentence(self) -> str:
+        return " ".join(self.random.choice(Synthetic.words) for _ in range(self.random.randint(5, 15)))
+
+    # código com marcações do filter em vários degraus
+    def code(self, lines: int, com: str = "//") -> str:
+        output = ["#include <iostream>", "int main() {"]
+        while len(output) < lines:
+            level = self.random.randint(1, 3)
+            output.append(com + "++" + str(level))
+            for depth in range(1, 5):
+                output.append("    " * depth + "x += " + str(depth) + ";")
+            output.append(com + "==")
+            output.append("    return 0;")
+        output.append("}")
+        return "\n".join(output) + "\n"
+
+    def readme(self, index: int) -> str:
+        out = ["# @h%d Problema %d" % (index, index), "", "<!-- toc -->", "<!-- toc -->", ""]
+        # tamanhos variados para não medir só um caso
+        for section in range(self.random.randint(1, self.sections)):
+            out += ["## Seção %d" % section, ""]
+            for _ in range(self.random.randint(2, 10)):
+                out.append(self.sentence() + " [arquivo](main.cpp), ![img](img.png), [pasta](src/), `[x](y.md)`.")
+            out += ["", "```py", "## não é título", "[x](dentro.md)", "```", ""]
+        out += ["## Testes", "", "```"]
+        for case in range(3):
+            out += [">>>>>>>> caso %d" % case, str(case), "========", str(case * 2), "<<<<<<<<", ""]
+        out += ["```", "", "<!-- load main.cpp fenced:filter -->", "<!-- load -->", "",
+                "<!-- draft -->", "<!-- draft -->", ""]
+        return "\n".join(out)
+
+    def cases(self, count: int) -> str:
+        return "".join(">>>>>>>>\n%d %d\n========\n%d\n<<<<<<<<\n" % (i, i, 2 * i) for i in range(count))
+
+    @staticmethod
+    def write(path: str, content: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    # remote.cfg, índice na raiz e base/hN com Readme, fontes, testes e configuração
+    def repo(self, folder: str, hooks: int):
+        Synthetic.write(os.path.join(folder, "remote.cfg"), "[DEFAULT]\nuser = github_user\nrep = arcade\nbase = base\n")
+        index = ["# Índice", ""]
+        for i in range(1, hooks + 1):
+            if (i - 1) % 10 == 0:
+                index += ["", "## Bloco %d" % ((i - 1) // 10), ""]
+            index.append("- [@h%d Problema %d](base/h%d/Readme.md)" % (i, i, i))
+            hook = os.path.join(folder, "base", "h%d" % i)
+            Synthetic.write(os.path.join(hook, "Readme.md"), self.readme(i))
+            code = self.code(self.lines)
+            Synthetic.write(os.path.join(hook, "main.cpp"), code)
+            Synthetic.write(os.path.join(hook, "src", "cpp", "student.cpp"), code)
+            Synthetic.write(os.path.join(hook, "src", "py", "student.py"), self.code(self.lines // 2, "#"))
+            Synthetic.write(os.path.join(hook, "cases.tio"), self.cases(self.random.randint(5, 50)))
+            Synthetic.write(os.path.join(hook, "config.json"), '{"upload": ["main.cpp"]}\n')
+        Synthetic.write(os.path.join(folder, "Readme.md"), "\n".join(index) + "\n")
+
+    # pandoc falso que só embrulha o markdown em html
+    @staticmethod
+    def fake_bin(folder: str):
+        os.makedirs(folder, exist_ok=True)
+        scripts = {
+            "pandoc": "import sys\nargs = sys.argv[1:]\nout = args[args.index('-o') + 1]\n"
+                      "open(out, 'w').write('<html><body>' + open(args[0]).read() + '</body></html>')\n",
+        }
+        for name, code in scripts.items():
+            path = os.path.join(folder, name)
+            with open(path, "w") as f:
+                f.write("#!" + sys.executable + "\n" + code)
+            os.chmod(path, 0o755)
+
+
+class Bench:
+    def __init__(self, repeat: int, only: Optional[str]):
+        self.repeat = repeat
+        self.only = only
+        self.results: Dict[str, Dict] = {}
+
+    # roda fn repeat vezes, chamando setup antes de cada medida sem contar seu tempo
+    def time(self, name: str, fn: Callable, setup: Optional[Callable] = None, repeat: Optional[int] = None):
+        if self.only is not None and self.only not in name:
+            return
+        runs: List[float] = []
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - start)
+        self.results[name] = {"min": min(runs), "median": statistics.median(runs), "runs": len(runs)}
+        print("%-28s %10.2f ms" % (name, min(runs) * 1000), flush=True)
+
+
+def run_all(bench: Bench, repo: str, env: Dict[str, str]):
+    base = os.path.join(repo, "base")
+    hooks = mbuild.Batch.find_hooks(base)
+    readmes = {}
+    for hook in hooks:
+        with open(os.path.join(hook, "Readme.md")) as f:
+            readmes[hook] = f.read()
+
+    big = Synthetic(1, 1, 1).code(20000)
+    bench.time("filter.process", lambda: Filter("big.cpp").process(big))
+
+    docs: Dict[str, mdpp.Document] = {}
+
+    def parse():
+        for hook, content in readmes.items():
+            docs[hook] = mdpp.Document(content, hook)
+    bench.time("mdpp.parse", parse)
+    if len(docs) == 0:
+        parse()
+
+    def toc():
+        for doc in docs.values():
+            mdpp.TocMaker.execute_toc(doc.headings)
+    bench.time("mdpp.toc", toc)
+
+    def load():
+        for doc in docs.values():
+            for block in doc.blocks:
+                if block.kind == "load":
+                    mdpp.Load.execute(doc, block, mdpp.Action.RUN)
+    bench.time("mdpp.load", load, setup=mdpp.Load.filtered.clear)
+
+    def render():
+        for hook, doc in docs.items():
+            mdpp.render(os.path.join(hook, "Readme.md"), doc, mdpp.Action.RUN)
+    bench.time("mdpp.render", render, setup=mdpp.Load.filtered.clear)
+
+    def remote():
+        for content in readmes.values():
+            mbuild.Remote.replace_remote(content, "github_user", "arcade", "base/hook")
+    bench.time("remote.replace_remote", remote)
+
+    copies = os.path.join(repo, "copies")
+
+    def copy():
+        for hook in hooks:
+            name = os.path.basename(hook)
+            mbuild.Tree.deep_filter_copy(os.path.join(hook, "src"), os.path.join(copies, name),
+                                         5, os.path.join(copies, name + ".json"))
+    bench.time("tree.copy.cold", copy, setup=lambda: shutil.rmtree(copies, ignore_errors=True))
+    bench.time("tree.copy.warm", copy)
+
+    def vpl_json():
+        for hook in hooks:
+            vpl = mbuild.JsonVPL(os.path.basename(hook), os.path.join(hook, "Readme.md"))
+            vpl.set_cases(os.path.join(hook, "cases.tio"))
+            vpl.add_upload(os.path.join(hook, "main.cpp"))
+            vpl.add_draft("cpp", os.path.join(hook, "src", "cpp", "student.cpp"))
+            vpl.add_draft("py", os.path.join(hook, "src", "py", "student.py"))
+            vpl.to_json()
+    bench.time("jsonvpl.to_json", vpl_json)
+
+    def mbuild_run(*args: str):
+        cmd = [sys.executable, os.path.join(here, "mbuild.py"), "-b", "base"] + list(args)
+        subprocess.run(cmd, cwd=repo, env=env, stdout=subprocess.DEVNULL, check=True)
+
+    def clean():
+        for hook in hooks:
+            shutil.rmtree(os.path.join(hook, ".cache"), ignore_errors=True)
+    pipeline_repeat = max(1, bench.repeat // 2)
+    bench.time("mbuild.cold", lambda: mbuild_run("-j", "1"), setup=clean, repeat=pipeline_repeat)
+    bench.time("mbuild.check", lambda: mbuild_run("-j", "1", "-c"), repeat=pipeline_repeat)
+    bench.time("mbuild.cold.parallel", lambda: mbuild_run(), setup=clean, repeat=pipeline_repeat)
+
+
+# compara com um resultado anterior; retorna os nomes que ficaram mais lentos que o limite
+def compare(results: Dict[str, Dict], old: Dict[str, Dict], threshold: float, limits: Dict[str, float]) -> List[str]:
+    regressions: List[str] = []
+    print("\n%-28s %10s %10s %8s" % ("", "old ms", "new ms", "change"))
+    for name, result in results.items():
+        if name not in old:
+            continue
+        before = old[name]["min"]
+        after = result["min"]
+        change = (after - before) / before if before > 0 else 0.0
+        limit = limits.get(name, threshold)
+        mark = " !" if change > limit else ""
+        if change > limit:
+            regressions.append(name)
+        print("%-28s %10.2f %10.2f %+7.1f%%%s" % (name, before * 1000, after * 1000, change * 100, mark))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmarks on a synthetic course repository")
+    parser.add_argument("--hooks", type=int, default=50, help="number of hooks in the synthetic repo")
+    parser.add_argument("--sections", type=int, default=8, help="maximum sections per Readme")
+    parser.add_argument("--lines", type=int, default=200, help="lines of each source file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", "-r", type=int, default=5, help="measures per benchmark, the minimum is kept")
+    parser.add_argument("--only", type=str, help="run only the benchmarks whose name contains this text")
+    parser.add_argument("--dir", type=str, help="generate the repo here and keep it")
+    parser.add_argument("--output", "-o", type=str, help="json file with the results")
+    parser.add_argument("--compare", type=str, help="json file of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 is 25%%")
+    parser.add_argument("--limit", action="append", default=[], metavar="NAME=RATIO",
+                        help="allowed slowdown for one benchmark")
+    args = parser.parse_args(argv)
+
+    folder = args.dir if args.dir else tempfile.mkdtemp(prefix="bench")
+    repo = os.path.join(folder, "repo")
+    shutil.rmtree(repo, ignore_errors=True)
+    Synthetic(args.seed, args.sections, args.lines).repo(repo, args.hooks)
+    fake = os.path.join(folder, "bin")
+    Synthetic.fake_bin(fake)
+    env = dict(os.environ, PATH=fake + os.pathsep + os.environ.get("PATH", ""))
+
+    bench = Bench(args.repeat, args.only)
+    try:
+        run_all(bench, repo, env)
+    finally:
+        if not args.dir:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    output = {
+        "meta": {"hooks": args.hooks, "sections": args.sections, "lines": args.lines, "seed": args.seed,
+                 "repeat": args.repeat, "python": platform.python_version(), "time": time.time()},
+        "results": bench.results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)["results"]
+        limits = {}
+        for item in args.limit:
+            name, _, value = item.partition("=")
+            limits[name] = float(value)
+        regressions = compare(bench.results, old, args.threshold, limits)
+        if len(regressions) > 0:
+            print("regressions:", " ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
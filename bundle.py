@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Junta os mapi.json de todos os hooks num zip endereçado por conteúdo:
+#   objects/<sha1>     conteúdo de cada arquivo, guardado uma única vez
+#   hooks/<hook>.json  documento do hook com os conteúdos trocados por referências
+
+import os
+import sys
+import json
+import hashlib
+import zipfile
+import argparse
+from typing import Dict, List, Optional, Set, Tuple
+
+from mbuild import Batch
+
+class Bundle:
+    file_keys = ["upload", "keep", "required"]
+
+    @staticmethod
+    def sha1(data: bytes) -> str:
+        return hashlib.sha1(data).hexdigest()
+
+    # troca cada conteúdo por uma referência, guardando o texto em objects
+    @staticmethod
+    def split(doc: Dict, objects: Dict[str, bytes]) -> Dict:
+        def store(text: str) -> str:
+            data = text.encode("utf-8")
+            key = Bundle.sha1(data)
+            objects[key] = data
+            return key
+
+        def files(entries: List[Dict]) -> List[Dict]:
+            output = []
+            for entry in entries:
+                item = dict(entry)
+                item["contents"] = {"object": store(entry["contents"])}
+                output.append(item)
+            return output
+
+        output = dict(doc)
+        output["description"] = {"object": store(doc["description"])}
+        for key in Bundle.file_keys:
+            output[key] = files(doc[key])
+        output["draft"] = {lang: files(entries) for lang, entries in doc["draft"].items()}
+        return output
+
+    @staticmethod
+    def join(doc: Dict, read_object) -> Dict:
+        def files(entries: List[Dict]) -> List[Dict]:
+            output = []
+            for entry in entries:
+                item = dict(entry)
+                item["contents"] = read_object(entry["contents"]["object"]).decode("utf-8")
+                output.append(item)
+            return output
+
+        output = dict(doc)
+        output["description"] = read_object(doc["description"]["object"]).decode("utf-8")
+        for key in Bundle.file_keys:
+            output[key] = files(doc[key])
+        output["draft"] = {lang: files(entries) for lang, entries in doc["draft"].items()}
+        return output
+
+    # mesmo formato escrito pelo mbuild
+    @staticmethod
+    def dump(doc: Dict) -> bytes:
+        return (json.dumps(doc, indent=4) + "\n").encode("utf-8")
+
+    # manifesto do hook; se o documento não for reproduzível, guarda o arquivo inteiro
+    @staticmethod
+    def manifest(hook: str, raw: bytes, objects: Dict[str, bytes]) -> Dict:
+        manifest = {"hook": hook, "sha1": Bundle.sha1(raw)}
+        try:
+            doc = json.loads(raw.decode("utf-8"))
+            pieces: Dict[str, bytes] = {}
+            document = Bundle.split(doc, pieces)
+            if Bundle.dump(Bundle.join(document, lambda key: pieces[key])) == raw:
+                objects.update(pieces)
+                manifest["document"] = document
+                return manifest
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+        objects[manifest["sha1"]] = raw
+        manifest["raw"] = manifest["sha1"]
+        return manifest
+
+    @staticmethod
+    def pack(base: str, output: str) -> Tuple[int, int, int]:
+        hooks = Batch.find_hooks(base)
+        written: Set[str] = set()
+        total = 0
+        unique = 0
+        count = 0
+        with zipfile.ZipFile(output + ".tmp", "w", zipfile.ZIP_DEFLATED) as archive:
+            for folder in hooks:
+                mapi = os.path.join(folder, ".cache", "mapi.json")
+                if not os.path.isfile(mapi):
+                    print("warning:", os.path.basename(folder), "has no mapi.json")
+                    continue
+                hook = os.path.basename(os.path.abspath(folder))
+                with open(mapi, "rb") as f:
+                    raw = f.read()
+                objects: Dict[str, bytes] = {}
+                manifest = Bundle.manifest(hook, raw, objects)
+                for key, data in objects.items():
+                    total += len(data)
+                    if key not in written:
+                        archive.writestr("objects/" + key, data)
+                        written.add(key)
+                        unique += len(data)
+                archive.writestr("hooks/" + hook + ".json", json.dumps(manifest, indent=1))
+                count += 1
+        os.replace(output + ".tmp", output)
+        return count, total, unique
+
+    @staticmethod
+    def hooks(bundle: str) -> List[str]:
+        with zipfile.ZipFile(bundle) as archive:
+            names = [name for name in archive.namelist() if name.startswith("hooks/")]
+        return sorted(name[len("hooks/"):-len(".json")] for name in names)
+
+    # reconstrói o mapi.json original de um hook
+    @staticmethod
+    def load(bundle: str, hook: str) -> bytes:
+        with zipfile.ZipFile(bundle) as archive:
+            try:
+                manifest = json.loads(archive.read("hooks/" + hook + ".json"))
+            except KeyError:
+                raise KeyError("hook " + hook + " not found in " + bundle)
+
+            def read_object(key: str) -> bytes:
+                return archive.read("objects/" + key)
+
+            if "raw" in manifest:
+                raw = read_object(manifest["raw"])
+            else:
+                raw = Bundle.dump(Bundle.join(manifest["document"], read_object))
+        if Bundle.sha1(raw) != manifest["sha1"]:
+            raise ValueError("hook " + hook + " does not match its original sha1")
+        return raw
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Deduplicated bundle of the hooks mapi.json")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="bundle the mapi.json of every hook in base")
+    pack.add_argument("base", type=str, nargs="?", default="base", help="base folder with the hooks")
+    pack.add_argument("--output", "-o", type=str, default="mapi.zip", help="bundle file")
+    show = sub.add_parser("list", help="list the hooks in the bundle")
+    show.add_argument("bundle", type=str)
+    load = sub.add_parser("load", help="rebuild the mapi.json of one hook")
+    load.add_argument("bundle", type=str)
+    load.add_argument("hook", type=str)
+    load.add_argument("--output", "-o", type=str, help="output file, default stdout")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        count, total, unique = Bundle.pack(args.base, args.output)
+        print("Hooks:", count, "Contents:", total, "bytes", "Unique:", unique, "bytes")
+    elif args.command == "list":
+        for hook in Bundle.hooks(args.bundle):
+            print(hook)
+    else:
+        try:
+            raw = Bundle.load(args.bundle, args.hook)
+        except (KeyError, ValueError) as e:
+            print("error:", e.args[0])
+            sys.exit(1)
+        if args.output:
+            with open(args.output, "wb") as f:
+                f.write(raw)
+        else:
+            sys.stdout.buffer.write(raw)
+
+
+if __name__ == '__main__':
+    main()
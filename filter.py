@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from curses.ascii import isupper
 import os
+import sys
 import argparse
 import enum
-from typing import Tuple
+import filecmp
+import concurrent.futures
+import shutil
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 
 class Mode(enum.Enum):
     ADD = 1 # inserir cortando por degrau
@@ -14,14 +17,33 @@ class Mode(enum.Enum):
     COM = 4 # inserir código removendo comentários
 
 class Filter:
-    def __init__(self, filename):
+    # comentário de linha usado nas marcações, por extensão
+    comments: Dict[str, str] = {
+        ".c": "//", ".cpp": "//", ".h": "//", ".hpp": "//", ".java": "//", ".js": "//", ".ts": "//",
+        ".py": "#", ".sh": "#",
+        # os hooks em haskell já usam //++N e //-- nas marcações
+        ".hs": "//",
+        ".md": "//", ".txt": "//",
+    }
+    default_comment = "//"
+
+    @staticmethod
+    def comment_for(filename: str) -> str:
+        return Filter.comments.get(os.path.splitext(filename)[1], Filter.default_comment)
+
+    def __init__(self, filename: str, comment: Optional[str] = None):
         self.mode = Mode.RAW
         self.backup_mode = Mode.RAW
         self.level = 1
-        self.com = "//"
-        if filename.endswith(".py"):
-            self.com = "#"
-    
+        self.com = comment if comment is not None else Filter.comment_for(filename)
+        # marcações pré-calculadas para a linguagem
+        self.add_tag = self.com + "++"
+        self.add_slice = -(3 + len(self.com))
+        self.raw_tag = self.com + "=="
+        self.del_tag = self.com + "--"
+        self.uncomment = self.com + " "
+        self.margins: Dict[int, str] = {}
+
     def init_raw(self):
         self.mode = Mode.RAW
         return self
@@ -40,79 +62,189 @@ class Filter:
             return True
         if line == "":
             return True
-        margin = (self.level + 1) * "    "
+        margin = self.margins.get(self.level)
+        if margin is None:
+            margin = (self.level + 1) * "    "
+            self.margins[self.level] = margin
         if line.startswith(margin):
             return False
 
         return True
 
-    def process(self, content: str) -> str:
-        lines = content.split("\n")
-        output = []
+    # filtra linhas sem o \n final, uma a uma
+    def run(self, lines: Iterable[str]) -> Iterator[str]:
+        com = self.com
         for line in lines:
-            alone = len(line.split(" ")) == 1
-            two_words = len(line.strip().split(" ")) == 2
             if self.mode == Mode.COM:
-                if not line.strip().startswith(self.com):
+                if not line.lstrip().startswith(com):
                     self.mode = self.backup_mode
-            if two_words and line.endswith("$$") and self.mode == Mode.ADD:
+            if self.mode == Mode.ADD and line.endswith("$$") and len(line.strip().split(" ")) == 2:
                 self.backup_mode = self.mode
                 self.mode = Mode.COM
-            elif line[-(3 + len(self.com)):-1] == self.com + "++":
+            elif line[self.add_slice:-1] == self.add_tag and line[-1].isdigit():
                 self.mode = Mode.ADD
                 self.level = int(line[-1])
-            elif line == self.com + "==":
+            elif line == self.raw_tag:
                 self.mode = Mode.RAW
-            elif line == self.com + "--":
+            elif line == self.del_tag:
                 self.mode = Mode.DEL
             elif self.evaluate_insert(line):
                 if self.mode == Mode.COM:
-                    line = line.replace(self.com + " ", "", 1)
-                output.append(line)
-        return "\n".join(output)
+                    line = line.replace(self.uncomment, "", 1)
+                yield line
+
+    def process(self, content: str) -> str:
+        return "\n".join(self.run(content.split("\n")))
 
+    # linhas de um arquivo sem o \n, com o mesmo resultado de content.split("\n")
+    @staticmethod
+    def lines(source: TextIO) -> Iterator[str]:
+        last = ""
+        for line in source:
+            last = line
+            yield line[:-1] if line.endswith("\n") else line
+        if last == "" or last.endswith("\n"):
+            yield ""
 
+    # filtra de um arquivo para outro sem carregar o conteúdo inteiro
+    def stream(self, source: TextIO, destiny: TextIO, batch: int = 4096):
+        buffer: List[str] = []
+        first = True
+        for line in self.run(Filter.lines(source)):
+            buffer.append(line)
+            if len(buffer) == batch:
+                destiny.write(("" if first else "\n") + "\n".join(buffer))
+                first = False
+                buffer = []
+        if len(buffer) > 0:
+            destiny.write(("" if first else "\n") + "\n".join(buffer))
 
-class Main:
+    # escreve em output apenas se o conteúdo filtrado for diferente do atual
+    def stream_to_file(self, source: TextIO, output: str) -> bool:
+        temp = output + ".tmp"
+        try:
+            with open(temp, "w") as f:
+                self.stream(source, f)
+            if os.path.isfile(output):
+                if filecmp.cmp(temp, output, shallow=False):
+                    return False
+                shutil.copymode(output, temp)
+            os.replace(temp, output)
+            return True
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    # filtra o arquivo source em output, escrevendo só se mudar
     @staticmethod
-    def open_file(path: str) -> Tuple[bool, str]:  
-        if os.path.isfile(path):
-            with open(path) as f:
-                file_content = f.read()
-                return True, file_content
-        print("Warning: File", path, "not found")
-        return False, "" 
-
-def open_file(path): 
-        if os.path.isfile(path):
-            with open(path) as f:
-                file_content = f.read()
-                return True, file_content
-        print("Warning: File", path, "not found")
-        return False, "" 
-
-def main():
+    def filter_file(source: str, output: str, comment: Optional[str] = None) -> bool:
+        with open(source) as f:
+            return Filter(source, comment).stream_to_file(f, output)
+
+
+class Batch:
+    # pares (entrada, saída): arquivos vão para destiny/nome, pastas são espelhadas em destiny
+    # ValueError se duas entradas diferentes forem para a mesma saída
+    @staticmethod
+    def plan(inputs: List[str], destiny: str) -> List[Tuple[str, str]]:
+        pairs: List[Tuple[str, str]] = []
+        for path in inputs:
+            if os.path.isdir(path):
+                pairs.extend(Batch.walk(path, destiny))
+            elif os.path.isfile(path):
+                pairs.append((path, os.path.join(destiny, os.path.basename(path))))
+            else:
+                print("Warning: File", path, "not found")
+
+        owners: Dict[str, str] = {}
+        unique: List[Tuple[str, str]] = []
+        conflicts: List[str] = []
+        for source, output in pairs:
+            key = os.path.normpath(output)
+            if key not in owners:
+                owners[key] = source
+                unique.append((source, output))
+            elif os.path.realpath(owners[key]) != os.path.realpath(source):
+                conflicts.append(key + " <- " + owners[key] + ", " + source)
+        if len(conflicts) > 0:
+            raise ValueError("same output for different inputs: " + "; ".join(conflicts))
+        return unique
+
+    @staticmethod
+    def walk(source: str, destiny: str) -> Iterator[Tuple[str, str]]:
+        with os.scandir(source) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir():
+                    yield from Batch.walk(entry.path, os.path.join(destiny, entry.name))
+                elif entry.is_file():
+                    yield entry.path, os.path.join(destiny, entry.name)
+
+    # nas pastas, só os arquivos de extensão conhecida são filtrados, o resto é copiado
+    @staticmethod
+    def work(pair: Tuple[str, str], comment: Optional[str], explicit: bool) -> bool:
+        source, output = pair
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        if explicit or comment is not None or os.path.splitext(source)[1] in Filter.comments:
+            return Filter.filter_file(source, output, comment)
+        if os.path.isfile(output) and filecmp.cmp(source, output, shallow=False):
+            return False
+        shutil.copyfile(source, output)
+        return True
+
+    @staticmethod
+    def run(inputs: List[str], destiny: str, comment: Optional[str], jobs: int) -> List[str]:
+        pairs = Batch.plan(inputs, destiny)
+        explicit = [path in inputs for path, _ in pairs]
+        if jobs <= 1 or len(pairs) < 2:
+            changed = [Batch.work(pair, comment, flag) for pair, flag in zip(pairs, explicit)]
+        else:
+            chunk = max(1, len(pairs) // (jobs * 4))
+            with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+                changed = list(pool.map(Batch.work, pairs, [comment] * len(pairs), explicit, chunksize=chunk))
+        return [output for (_, output), flag in zip(pairs, changed) if flag]
+
+
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('file', type=str, help='file to process')
-    parser.add_argument('-u', '--update', action="store_true", help='update source file')
+    parser.add_argument('files', type=str, nargs="+", help='files or folders to process, - for stdin')
+    parser.add_argument('-u', '--update', action="store_true", help='update source files')
     parser.add_argument('-o', '--output', type=str, help='output file')
-    args = parser.parse_args()
-
-    success, content = open_file(args.file)
-    if success:
-        content = Filter(args.file).process(content)
-        if args.output:
-            if os.path.isfile(args.output):
-                old = open(args.output).read()
-                if old != content:
-                    open(args.output, "w").write(content)
-            else:                
-                open(args.output, "w").write(content)
-        elif args.update:
-            with open(args.file, "w") as f:
-                f.write(content)
-        else:
-            print(content)
+    parser.add_argument('-d', '--dir', type=str, help='output folder, folders given as input are mirrored into it')
+    parser.add_argument('-c', '--comment', type=str, help='line comment used in the markers, default by extension')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='parallel workers with -d')
+    parser.add_argument('-v', '--verbose', action="store_true", help='print the updated outputs')
+    args = parser.parse_args(argv)
+
+    if args.dir:
+        try:
+            outputs = Batch.run(args.files, args.dir, args.comment, args.jobs)
+        except ValueError as e:
+            print("error:", e.args[0])
+            sys.exit(1)
+        for output in outputs:
+            if args.verbose:
+                print("updated", output)
+        return
+
+    if len(args.files) > 1 and not args.update:
+        parser.error("use -d or -u with more than one file")
+
+    for path in args.files:
+        if path != "-" and not os.path.isfile(path):
+            print("Warning: File", path, "not found")
+            continue
+        engine = Filter(path if path != "-" else "", args.comment)
+        source = sys.stdin if path == "-" else open(path)
+        with source:
+            if args.output:
+                engine.stream_to_file(source, args.output)
+            elif args.update:
+                engine.stream_to_file(source, path)
+            else:
+                engine.stream(source, sys.stdout)
+                sys.stdout.write("\n")
 
 if __name__ == '__main__':
     main()
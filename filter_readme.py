@@ -1,19 +1,22 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+# lista seção:rótulo dos hooks citados no Readme.md do repositório
 
-def get_label(line):
-    return line.split("@")[1].split(" ")[0].split("]")[0]
-
-output = []
-with open("Readme.md") as f:
-    count = 0
-    lines = f.read().split("\n")
-    for line in lines:
-        if line.startswith("## "):
-            count += 1
-        elif "base/" in line and "/Readme.md" in line and "@" in line:
-            label = get_label(line)
-            output.append(str(count) + ":" + label)
-
-print(" ".join(output))
\ No newline at end of file
+import argparse
+from typing import List, Optional
+
+from hookdb import HookDB
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Print section:label of the hooks listed in Readme.md")
+    parser.parse_args(argv)
+
+    db = HookDB.open(".")
+    output = [str(section) + ":" + label for _, section, label, _ in db.sections("Readme.md")]
+    print(" ".join(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+import hashlib
+import contextlib
+from typing import Dict, List, Optional, Iterable, Iterator, Tuple, Set
+
+# Impressão digital de arquivos: [tamanho, mtime_ns, sha1]
+class Fingerprint:
+    chunk_size = 1 << 20
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(Fingerprint.chunk_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    # só calcula o hash se tamanho ou mtime mudaram desde a entrada anterior
+    @staticmethod
+    def entry(path: str, old: Optional[List] = None) -> List:
+        st = os.stat(path)
+        if old is not None and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+            return old
+        return [st.st_size, st.st_mtime_ns, Fingerprint.file_hash(path)]
+
+    @staticmethod
+    def collect(paths: Iterable[str], old: Dict[str, List], folder: str = ".") -> Dict[str, List]:
+        output: Dict[str, List] = {}
+        for path in paths:
+            full = os.path.join(folder, path)
+            if os.path.isfile(full):
+                output[path] = Fingerprint.entry(full, old.get(path))
+        return output
+
+    # retorna um arquivo cujo conteúdo difere entre as duas coleções, ou None
+    @staticmethod
+    def changed(new: Dict[str, List], old: Dict[str, List]) -> Optional[str]:
+        for path, entry in new.items():
+            if path not in old or old[path][2] != entry[2]:
+                return path
+        for path in old:
+            if path not in new:
+                return path
+        return None
+
+
+class Snapshot:
+    # {caminho relativo à base: (tamanho, mtime_ns)}, ignorando pastas e arquivos ocultos
+    @staticmethod
+    def take(base: str) -> Dict[str, Tuple[int, int]]:
+        output: Dict[str, Tuple[int, int]] = {}
+        pending = [base]
+        while len(pending) > 0:
+            folder = pending.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file():
+                    st = entry.stat()
+                    output[os.path.relpath(entry.path, base)] = (st.st_size, st.st_mtime_ns)
+        return output
+
+    @staticmethod
+    def diff(old: Dict[str, Tuple[int, int]], new: Dict[str, Tuple[int, int]]) -> Set[str]:
+        changed = set(path for path, value in new.items() if old.get(path) != value)
+        return changed | set(path for path in old if path not in new)
+
+
+# Arquivos de um hook lidos numa única varredura e consultados por todas as etapas do build.
+# Caminhos relativos ao hook; pastas ocultas (.cache) e caminhos fora do hook ficam fora
+# da varredura e são consultados direto no disco. Os hashes só são calculados quando pedidos.
+class HookFiles:
+    active: Dict[str, "HookFiles"] = {} # varreduras em uso, pela pasta absoluta do hook
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.files: Dict[str, Tuple[int, int]] = {}
+        self.children: Dict[str, List[str]] = {}
+        self.hidden: Set[str] = set()
+        self.hashes: Dict[Tuple[str, int, int], str] = {}
+        self.refresh()
+
+    # refaz a varredura, depois de algo externo (local.sh, mdpp) mexer no hook
+    def refresh(self):
+        files: Dict[str, Tuple[int, int]] = {}
+        children: Dict[str, List[str]] = {"": []}
+        hidden: Set[str] = set()
+        pending = [""]
+        while len(pending) > 0:
+            folder = pending.pop()
+            try:
+                with os.scandir(os.path.join(self.folder, folder)) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError:
+                continue
+            names = children[folder]
+            for entry in entries:
+                path = os.path.join(folder, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    # pastas ocultas aparecem na listagem, como no os.listdir, mas não são varridas
+                    names.append(entry.name)
+                    if entry.name.startswith("."):
+                        hidden.add(path)
+                    else:
+                        children[path] = []
+                        pending.append(path)
+                elif entry.is_file():
+                    st = entry.stat()
+                    names.append(entry.name)
+                    files[path] = (st.st_size, st.st_mtime_ns)
+        # troca as tabelas de uma vez, as etapas podem estar lendo em outras threads
+        self.files, self.children, self.hidden = files, children, hidden
+
+    # registra a varredura para consultas de outros módulos (mdpp) sobre a mesma pasta
+    @contextlib.contextmanager
+    def shared(self) -> Iterator["HookFiles"]:
+        key = os.path.abspath(self.folder)
+        HookFiles.active[key] = self
+        try:
+            yield self
+        finally:
+            del HookFiles.active[key]
+
+    @staticmethod
+    def find(folder: str) -> Optional["HookFiles"]:
+        return HookFiles.active.get(os.path.abspath(folder))
+
+    @staticmethod
+    def covered(path: str) -> bool:
+        if os.path.isabs(path):
+            return False
+        parts = path.split(os.sep)
+        return parts[0] != ".." and not any(part.startswith(".") for part in parts[:-1])
+
+    def stat(self, path: str) -> Optional[Tuple[int, int]]:
+        path = os.path.normpath(path)
+        if HookFiles.covered(path):
+            return self.files.get(path)
+        try:
+            st = os.stat(os.path.join(self.folder, path))
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns) if stat.S_ISREG(st.st_mode) else None
+
+    def isdir(self, path: str) -> bool:
+        path = os.path.normpath(path)
+        if path in self.children or path in self.hidden:
+            return True
+        return not HookFiles.covered(path) and os.path.isdir(os.path.join(self.folder, path))
+
+    # mesmos nomes do os.listdir, em ordem alfabética; pastas fora da varredura são lidas do disco
+    def listdir(self, path: str) -> List[str]:
+        path = os.path.normpath(path)
+        key = "" if path == "." else path
+        if key in self.children:
+            return list(self.children[key])
+        return sorted(os.listdir(os.path.join(self.folder, path)))
+
+    # arquivos até deep - 1 níveis abaixo de folder, relativos a folder, na ordem do Tree.walk
+    def walk(self, folder: str, deep: int, prefix: str = "") -> Iterator[str]:
+        if deep <= 1:
+            return
+        base = os.path.normpath(os.path.join(folder, prefix))
+        for name in self.listdir(base):
+            path = os.path.join(base, name) if base != "." else name
+            if path in self.children:
+                yield from self.walk(folder, deep - 1, prefix + name + os.sep)
+            elif path in self.files:
+                yield prefix + name
+
+    # hash calculado uma vez por versão do arquivo
+    def hash(self, path: str) -> str:
+        path = os.path.normpath(path)
+        value = self.stat(path)
+        if value is None or not HookFiles.covered(path):
+            return Fingerprint.file_hash(os.path.join(self.folder, path))
+        key = (path, value[0], value[1])
+        if key not in self.hashes:
+            self.hashes[key] = Fingerprint.file_hash(os.path.join(self.folder, path))
+        return self.hashes[key]
+
+    # mesmo resultado de Fingerprint.collect, sem nova consulta ao disco para arquivos da varredura
+    def collect(self, paths: Iterable[str], old: Dict[str, List], folder: str = "") -> Dict[str, List]:
+        output: Dict[str, List] = {}
+        for path in paths:
+            full = os.path.join(folder, path)
+            value = self.stat(full)
+            if value is None:
+                continue
+            entry = old.get(path)
+            if entry is not None and entry[0] == value[0] and entry[1] == value[1]:
+                output[path] = entry
+            else:
+                output[path] = [value[0], value[1], self.hash(full)]
+        return output
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Índice local em .cache/hooks.db na raiz do repositório
+#   readme:  primeira linha, título, rótulo e hash (só quando pedido) de cada Readme consultado
+#   section: links do índice para Readmes de hooks, com a seção (## ) em que aparecem
+# As linhas são refeitas apenas quando tamanho ou mtime do arquivo mudam
+
+import os
+import sqlite3
+import hashlib
+import concurrent.futures
+from typing import Dict, List, Optional, Tuple, Iterable
+
+class Readme:
+    def __init__(self, path: str, hook: str, header: str, title: str, label: str, hash: str):
+        self.path = path
+        self.hook = hook
+        self.header = header
+        self.title = title
+        self.label = label
+        self.hash = hash
+
+
+class HookDB:
+    limit = 4096 # tamanho máximo lido da primeira linha
+    opened: Dict[Tuple[int, str], "HookDB"] = {}
+    schema = """
+        CREATE TABLE IF NOT EXISTS readme (path TEXT PRIMARY KEY, hook TEXT, header TEXT, title TEXT,
+                                           label TEXT, size INTEGER, mtime_ns INTEGER, hash TEXT);
+        CREATE TABLE IF NOT EXISTS indexed (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER);
+        CREATE TABLE IF NOT EXISTS section (index_path TEXT, line INTEGER, section INTEGER, label TEXT,
+                                            link TEXT, PRIMARY KEY (index_path, line));
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        folder = os.path.join(self.root, ".cache")
+        os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(folder, "hooks.db"), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(HookDB.schema)
+
+    # uma conexão por processo e raiz
+    @staticmethod
+    def open(root: str) -> "HookDB":
+        key = (os.getpid(), os.path.abspath(root))
+        if key not in HookDB.opened:
+            HookDB.opened[key] = HookDB(root)
+        return HookDB.opened[key]
+
+    # título: primeira linha sem a palavra de #s
+    @staticmethod
+    def title(header: str) -> str:
+        parts = header.split(" ")
+        if parts[0].count("#") == len(parts[0]):
+            del parts[0]
+        return " ".join(parts)
+
+    # rótulo: palavra após o primeiro @, ou vazio
+    @staticmethod
+    def label(text: str) -> str:
+        if "@" not in text:
+            return ""
+        return text.split("@")[1].split(" ")[0].split("]")[0]
+
+    @staticmethod
+    def stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    # lê a primeira linha e, se hashed, o hash do arquivo inteiro; fora da conexão para poder rodar em threads
+    @staticmethod
+    def scan(path: str, hashed: bool = False) -> Tuple[str, str]:
+        with open(path, "rb") as f:
+            first = f.readline(HookDB.limit)
+            hash = ""
+            if hashed:
+                digest = hashlib.sha1(first)
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+                hash = digest.hexdigest()
+        header = first.decode("utf-8", errors="replace").rstrip("\r\n")
+        return header, hash
+
+    # linhas atualizadas dos Readmes; arquivos inexistentes ficam com None
+    # sem hashed o hash fica vazio e só a primeira linha de cada arquivo é lida
+    def readmes(self, paths: Iterable[str], jobs: int = 1, hashed: bool = False) -> Dict[str, Optional[Readme]]:
+        paths = [os.path.abspath(path) for path in paths]
+        stats = {path: HookDB.stat(path) for path in paths}
+        rows: Dict[str, Tuple] = {}
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            query = "SELECT path, hook, header, title, label, size, mtime_ns, hash FROM readme WHERE path IN (%s)"
+            for row in self.conn.execute(query % ",".join("?" * len(chunk)), chunk):
+                rows[row[0]] = row
+
+        stale = [path for path in paths if stats[path] is not None
+                 and (path not in rows or (rows[path][5], rows[path][6]) != stats[path]
+                      or (hashed and rows[path][7] == ""))]
+        if len(stale) > 0:
+            if jobs > 1:
+                with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+                    scanned = list(pool.map(HookDB.scan, stale, [hashed] * len(stale)))
+            else:
+                scanned = [HookDB.scan(path, hashed) for path in stale]
+            with self.conn:
+                for path, (header, hash) in zip(stale, scanned):
+                    title = HookDB.title(header)
+                    row = (path, os.path.basename(os.path.dirname(path)), header, title,
+                           HookDB.label(title), stats[path][0], stats[path][1], hash)
+                    self.conn.execute("INSERT OR REPLACE INTO readme VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+                    rows[path] = row
+
+        output: Dict[str, Optional[Readme]] = {}
+        for path in paths:
+            row = rows.get(path) if stats[path] is not None else None
+            output[path] = None if row is None else Readme(row[0], row[1], row[2], row[3], row[4], row[7])
+        return output
+
+    def readme(self, path: str, hashed: bool = False) -> Optional[Readme]:
+        return self.readmes([path], 1, hashed)[os.path.abspath(path)]
+
+    # [(linha, seção, rótulo, link)] dos links para Readmes de hooks no índice
+    def sections(self, index_path: str) -> List[Tuple[int, int, str, str]]:
+        index_path = os.path.abspath(index_path)
+        stat = HookDB.stat(index_path)
+        if stat is None:
+            return []
+        row = self.conn.execute("SELECT size, mtime_ns FROM indexed WHERE path = ?", (index_path,)).fetchone()
+        if row is None or tuple(row) != stat:
+            with open(index_path) as f:
+                lines = f.read().split("\n")
+            entries: List[Tuple[int, int, str, str]] = []
+            count = 0
+            for i, line in enumerate(lines):
+                if line.startswith("## "):
+                    count += 1
+                elif "base/" in line and "/Readme.md" in line and "@" in line:
+                    link = line.split("](", 1)[1].split(")")[0] if "](" in line else ""
+                    entries.append((i, count, HookDB.label(line), link))
+            with self.conn:
+                self.conn.execute("DELETE FROM section WHERE index_path = ?", (index_path,))
+                self.conn.executemany("INSERT INTO section VALUES (?, ?, ?, ?, ?)",
+                                      [(index_path,) + entry for entry in entries])
+                self.conn.execute("INSERT OR REPLACE INTO indexed VALUES (?, ?, ?)", (index_path,) + stat)
+            return entries
+        query = "SELECT line, section, label, link FROM section WHERE index_path = ? ORDER BY line"
+        return [tuple(row) for row in self.conn.execute(query, (index_path,))]
@@ -1,82 +1,118 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+# Atualiza as descrições dos links do índice com o título de cada Readme
+# e confere se o rótulo @label de cada link bate com a pasta do hook
+
 import os
 import re
 import argparse
-import subprocess
-from typing import Optional, List, Dict
-from os.path import join, isdir, isfile, getmtime
-
-
-parser = argparse.ArgumentParser(description='Indexer')
-parser.add_argument('path', type=str, help='Path to Markdown file')
-
-args = parser.parse_args()
-
-
-
-## INDEXER
-
-with open(args.path, 'r') as file:
-    content = file.read()
-
-lines = content.split('\n')
-
-output = []
-
-for line in lines:
-    new_description = 'New description'
-    match = re.search(r'\[(.*?)\]\((.*?)\)', line)
-    data = line
-    if match:
-        link = match.group(2)
-        if link.endswith('md') and not link.startswith('http'):
-            if not isfile(link):
-                print(link, ' not found')
-            else:
-                header = open(match.group(2), 'r').read().split('\n')[0]
-                if (len(header) == 0):
-                    print('Empty header in ', link)
-                # remove first word
-                try:
-                    header = header.split(' ', 1)[1]
-                except:
-                    print('Error ', header)
-                    pass
-                new_description = header
-                #print(new_description)
-                #replace line with new description
-                data = line.replace(match.group(1), new_description)
-    output.append(data)
-
-with open(args.path, 'w') as file:
-    file.write('\n'.join(output))
-
-## check labels
-with open(args.path, 'r') as file:
-    data = file.read()
-    lines = data.split('\n')
-
-    ok = []
-    not_ok = []
-
-    for line in lines:
-        if "/Readme.md)" in line and not "https:" in line:
-            #print(line)
-            try:
-                label = line.split('@')[1].split(' ')[0].split(']')[0]
-            except:
-                print("error in", line)
-                continue
-            hook = line.split('base/')[1].split('/')[0] 
-            output = ("=" if label == hook else "!") + " " + label + " " + hook
-            if label == hook:
-                ok.append(output)
+from typing import Optional, List, Tuple
+
+from hookdb import HookDB
+
+class Entry:
+    def __init__(self, index: int, line: str, match: re.Match):
+        self.index = index
+        self.line = line
+        self.match = match
+        self.link: str = match.group(2)
+
+    def is_local_md(self) -> bool:
+        return self.link.endswith('md') and not self.link.startswith('http')
+
+
+class Indexer:
+    link_re = re.compile(r'\[(.*?)\]\((.*?)\)')
+
+    def __init__(self, path: str, jobs: int = 8):
+        self.path = path
+        self.folder = os.path.dirname(os.path.abspath(path))
+        self.jobs = jobs
+        # primeiras linhas vêm do índice do repositório, relidas só quando o arquivo muda
+        self.db = HookDB.open(self.folder)
+
+    # título a partir do cabeçalho, sem a primeira palavra
+    @staticmethod
+    def description(link: str, header: str) -> str:
+        if len(header) == 0:
+            print('Empty header in ', link)
+        try:
+            return header.split(' ', 1)[1]
+        except IndexError:
+            print('Error ', header)
+            return header
+
+    # rótulo @label e pasta do hook de uma linha que aponta para um Readme
+    @staticmethod
+    def label_check(line: str, link: str) -> Optional[Tuple[str, str]]:
+        if "@" not in line or "base/" not in link:
+            return None
+        label = line.split('@')[1].split(' ')[0].split(']')[0]
+        hook = link.split('base/')[1].split('/')[0]
+        return label, hook
+
+    # atualiza o índice; retorna as linhas alteradas e as checagens (rótulo, hook)
+    def update(self) -> Tuple[int, List[Tuple[str, str]]]:
+        with open(self.path) as f:
+            lines = f.read().split('\n')
+
+        entries: List[Entry] = []
+        for i, line in enumerate(lines):
+            match = Indexer.link_re.search(line)
+            if match:
+                entry = Entry(i, line, match)
+                if entry.is_local_md():
+                    entries.append(entry)
+
+        paths = [os.path.abspath(os.path.join(self.folder, entry.link)) for entry in entries]
+        readmes = self.db.readmes(paths, self.jobs)
+        headers = [None if readmes[path] is None else readmes[path].header for path in paths]
+
+        changed = 0
+        checks: List[Tuple[str, str]] = []
+        errors: List[str] = []
+        for entry, header in zip(entries, headers):
+            line = entry.line
+            if header is None:
+                print(entry.link, ' not found')
             else:
-                not_ok.append(output)
-
-    print("OK: ", len(ok))
+                start, end = entry.match.span(1)
+                line = line[:start] + Indexer.description(entry.link, header) + line[end:]
+                if line != entry.line:
+                    lines[entry.index] = line
+                    changed += 1
+            if entry.link.endswith("/Readme.md") and "https:" not in line:
+                check = Indexer.label_check(line, entry.link)
+                if check is None:
+                    errors.append(line)
+                else:
+                    checks.append(check)
+
+        for line in errors:
+            print("error in", line)
+
+        if changed > 0:
+            with open(self.path + ".tmp", 'w') as f:
+                f.write('\n'.join(lines))
+            os.replace(self.path + ".tmp", self.path)
+        return changed, checks
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Indexer')
+    parser.add_argument('path', type=str, help='Path to Markdown file')
+    parser.add_argument('--jobs', '-j', type=int, default=8, help='parallel reads of the linked files')
+    args = parser.parse_args(argv)
+
+    _, checks = Indexer(args.path, args.jobs).update()
+
+    not_ok = ["! " + label + " " + hook for label, hook in checks if label != hook]
+    print("OK: ", len(checks) - len(not_ok))
     print("Not OK:")
     for line in not_ok:
-        print(line)
\ No newline at end of file
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ponto de entrada único: judge <comando> [argumentos do comando]
+# Cada comando é o main() de um dos scripts, importado só quando usado
+
+import sys
+import importlib
+from typing import List, Optional
+
+commands = {
+    "build": ("mbuild", "build hooks into .cache/mapi.json"),
+    "mdpp": ("mdpp", "update the Readme directives"),
+    "filter": ("filter", "filter source files by their markers"),
+    "index": ("indexer", "update the descriptions of an index"),
+    "labels": ("filter_readme", "print section:label of the indexed hooks"),
+    "html": ("mdhtml", "render markdown to html"),
+    "status": ("status", "show which hooks need a rebuild"),
+    "watch": ("watch", "rebuild hooks when their files change"),
+    "bundle": ("bundle", "bundle or load deduplicated mapi.json files"),
+}
+
+def usage() -> str:
+    lines = ["usage: judge <command> [args]", "", "commands:"]
+    for name, (_, help) in commands.items():
+        lines.append("  %-8s %s" % (name, help))
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 0 or argv[0] in ["-h", "--help"]:
+        print(usage())
+        return
+    name = argv[0]
+    if name not in commands:
+        print("judge: unknown command", name)
+        print(usage())
+        sys.exit(2)
+    module = importlib.import_module(commands[name][0])
+    # o argparse de cada comando usa sys.argv[0] como nome do programa
+    sys.argv[0] = "judge " + name
+    module.main(argv[1:])
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,8 @@
 # -*- coding: utf-8 -*-
 
 
-from typing import List, Tuple, Dict
-from os.path import getmtime
+from typing import List, Tuple, Dict, Optional, Callable, Iterable, Iterator, Set, TextIO
+import sys
 import glob
 import configparser
 import os
@@ -15,6 +15,19 @@ import tempfile
 import json
 import enum
 import shutil
+import filecmp
+import io
+import base64
+import codecs
+import threading
+import contextlib
+import concurrent.futures
+from fingerprint import Fingerprint, HookFiles
+from filter import Filter
+import mdpp
+from hookdb import HookDB
+from timing import Profiler
+from mdhtml import MdHtml, Unsupported
 
 class Log:
     verbose = False
@@ -31,80 +44,279 @@ class Log:
         else:
             print(*args, **kwargs, end="", flush=True)
 
-class Check:
-    # return the last update for the most recent file in the directory
+class Manifest:
+    # arquivos do src/ e arquivos de testes do hook, relativos ao hook, na ordem do os.walk:
+    # arquivos de cada pasta antes das subpastas, ignorando os ocultos
     @staticmethod
-    def last_update(path) -> Tuple[str, float]:
-        value = 0
-        if os.path.isfile(path):
-            value = (path, getmtime(path))
-        else:
-            file_list = list(glob.iglob(path + '/**', recursive=True))
-            file_list = [f for f in file_list if os.path.isfile(f)]
-            # juntos = [(f, getmtime(f)) for f in file_list]
-            # print(juntos)
-            if len(file_list) == 0:
-                value = (path, getmtime(path))
-            else:
-                juntos = [(f, getmtime(f)) for f in file_list]
-                value = max(juntos, key=lambda x: x[1])
-        # print (value)
-        return value
+    def scan(files: HookFiles) -> Tuple[List[str], List[str]]:
+        def walk_key(path: str) -> List[Tuple[int, str]]:
+            parts = path.split(os.sep)
+            return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+        src_files: List[str] = []
+        case_files: List[str] = []
+        for path in sorted(files.files, key=walk_key):
+            name = os.path.basename(path)
+            if name.startswith("."):
+                continue
+            if path.startswith("src" + os.sep):
+                src_files.append(path)
+            if name.endswith(".tio") or name.endswith(".vpl"):
+                case_files.append(path)
+        return src_files, case_files
+
+    # todos os arquivos que alimentam o build
+    @staticmethod
+    def inputs(scan: Tuple[List[str], List[str]], config_files: List[str]) -> List[str]:
+        src_files, case_files = scan
+        files = ["Readme.md", "config.json", "local.sh", os.path.join("..", "..", "remote.cfg")]
+        files += src_files + case_files + config_files
+        return sorted(set(files))
 
-    # retorna se tem atualização e o arquivo mais recente
+    # arquivos que o build leria, mesmo que nenhuma etapa os tenha registrado ainda
     @staticmethod
-    def check_rebuild(source: str, target: str) -> Tuple[str, bool]:
-        if not os.path.exists(target):
-            return [source, True]
-        [source_path, source_time] = Check.last_update(source)
-        [target_path, target_time] = Check.last_update(target)
-        # source tem novas alterações
-        return (source_path, source_time > target_time)
+    def is_input(path: str) -> bool:
+        if path in ["Readme.md", "config.json", "local.sh"]:
+            return True
+        return path.startswith("src" + os.sep) or path.endswith(".tio") or path.endswith(".vpl")
 
+    # todos os arquivos registrados nas etapas do manifesto: {caminho: [tamanho, mtime_ns, sha1]}
+    @staticmethod
+    def recorded(path: str) -> Dict[str, List]:
+        output: Dict[str, List] = {}
+        for entries in Manifest.load(path).get("stages", {}).values():
+            output.update(entries)
+        return output
 
-class Remote:
+    # arquivos referenciados pelo config.json
+    @staticmethod
+    def config_files(source: str) -> List[str]:
+        cfg_json = os.path.join(source, "config.json")
+        if not os.path.isfile(cfg_json):
+            return []
+        with open(cfg_json) as f:
+            cfg = json.load(f)
+        return [os.path.normpath(file) for key in ["upload", "keep", "required"] for file in cfg.get(key, [])]
 
-    # processa o conteúdo trocando os links locais para links remotos utilizando a url remota
     @staticmethod
-    def __replace_remote(content: str, remote_raw: str, remote_view: str, remote_folder: str) -> str:
-        if not remote_raw.endswith("/"):
-            remote_raw += "/"
-        if not remote_view.endswith("/"):
-            remote_view += "/"
-        if not remote_folder.endswith("/"):
-            remote_folder += "/"
+    def load(path: str) -> Dict:
+        if os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    return json.load(f)
+            except ValueError:
+                pass
+        return {}
 
-        #trocando todas as imagens com link local
-        regex = r"!\[(.*?)\]\((\s*?)([^#:\s]*?)(\s*?)\)"
-        subst = "![\\1](" + remote_raw + "\\3)"
-        result = re.sub(regex, subst, content, 0)
+    @staticmethod
+    def save(path: str, data: Dict):
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
 
 
-        regex = r"\[(.+?)\]\((\s*?)([^#:\s]*?)(\s*?/)\)"
-        subst = "[\\1](" + remote_folder + "\\3)"
-        result = re.sub(regex, subst, result, 0)
+class Remote:
+    # urls remotas; {path} é o caminho do hook dentro do repositório
+    templates = {
+        "raw": "https://raw.githubusercontent.com/{user}/{repo}/{branch}/{path}",
+        "view": "https://github.com/{user}/{repo}/blob/{branch}/{path}",
+        "folder": "https://github.com/{user}/{repo}/tree/{branch}/{path}",
+    }
+    fence_re = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+    scheme_re = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.-]*:|//)")
+    text_re = re.compile(r"[^`\\\[!]+")
+
+    def __init__(self, user: str, repo: str, path: str, branch: str = "master", templates: Optional[Dict[str, str]] = None):
+        urls = dict(Remote.templates)
+        urls.update(templates or {})
+        self.urls: Dict[str, str] = {}
+        for kind, template in urls.items():
+            url = template.format(user=user, repo=repo, branch=branch, path=path)
+            self.urls[kind] = url if url.endswith("/") else url + "/"
+
+    # classifica o destino e troca os caminhos locais por urls remotas
+    def destination(self, target: str, image: bool) -> str:
+        inner = target.strip()
+        title = ""
+        pieces = inner.split(None, 1)
+        if len(pieces) == 2:
+            inner, title = pieces[0], " " + pieces[1]
+        if inner.startswith("#") or inner.startswith("<") or Remote.scheme_re.match(inner):
+            return target  # âncora ou endereço absoluto
+        path, sharp, fragment = inner.partition("#")
+        if image:
+            url = self.urls["raw"] + path
+        elif path.endswith("/"):
+            url = self.urls["folder"] + path[:-1]
+        else:
+            url = self.urls["view"] + path
+        return url + sharp + fragment + title
 
-        #trocando todos os links locais cujo conteudo nao seja vazio
-        regex = r"\[(.+?)\]\((\s*?)([^#:\s]*?)(\s*?)\)"
-        subst = "[\\1](" + remote_view + "\\3)"
-        result = re.sub(regex, subst, result, 0)
+    # índice do fechamento de um trecho de código iniciado em start, ou -1
+    @staticmethod
+    def __code_end(line: str, start: int) -> int:
+        size = 0
+        while start + size < len(line) and line[start + size] == "`":
+            size += 1
+        close = start + size
+        while True:
+            close = line.find("`" * size, close)
+            if close == -1:
+                return -1
+            end = close
+            while end < len(line) and line[end] == "`":
+                end += 1
+            if end - close == size:
+                return end
+            close = end
+
+    # posição do ] ou ) que fecha o que abre em start, pulando escapes e código
+    @staticmethod
+    def __matching(line: str, start: int, opening: str, closing: str) -> int:
+        depth = 0
+        i = start
+        while i < len(line):
+            c = line[i]
+            if c == "\\":
+                i += 2
+                continue
+            if c == "`" and opening == "[":
+                end = Remote.__code_end(line, i)
+                if end != -1:
+                    i = end
+                    continue
+            if c == opening:
+                depth += 1
+            elif c == closing:
+                depth -= 1
+                if depth == 0:
+                    return i
+            i += 1
+        return -1
+
+    # tenta ler um link ou imagem em start: (fim, texto reescrito)
+    def __link(self, line: str, start: int) -> Optional[Tuple[int, str]]:
+        image = line[start] == "!"
+        open_text = start + 1 if image else start
+        close_text = Remote.__matching(line, open_text, "[", "]")
+        if close_text == -1 or close_text + 1 >= len(line) or line[close_text + 1] != "(":
+            return None
+        text = line[open_text + 1:close_text]
+        if text == "" and not image:
+            return None
+        close_target = Remote.__matching(line, close_text + 1, "(", ")")
+        if close_target == -1:
+            return None
+        target = line[close_text + 2:close_target]
+        rewritten = ("!" if image else "") + "[" + self.rewrite_line(text) + "](" + self.destination(target, image) + ")"
+        return close_target + 1, rewritten
+
+    def rewrite_line(self, line: str) -> str:
+        output: List[str] = []
+        i = 0
+        while i < len(line):
+            c = line[i]
+            if c == "`":
+                end = Remote.__code_end(line, i)
+                if end == -1:
+                    end = i
+                    while end < len(line) and line[end] == "`":
+                        end += 1
+                output.append(line[i:end])
+                i = end
+            elif c == "\\":
+                output.append(line[i:i + 2])
+                i += 2
+            elif c == "[" or (c == "!" and line.startswith("[", i + 1)):
+                link = self.__link(line, i)
+                if link is None:
+                    output.append(c)
+                    i += 1
+                else:
+                    i, text = link
+                    output.append(text)
+            else:
+                match = Remote.text_re.match(line, i)
+                end = match.end() if match else i + 1
+                output.append(line[i:end])
+                i = end
+        return "".join(output)
+
+    # percorre o markdown uma vez, sem tocar nos blocos de código
+    def rewrite(self, content: str) -> str:
+        output: List[str] = []
+        fence = ""
+        for line in content.split("\n"):
+            match = Remote.fence_re.match(line)
+            if fence != "":
+                if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence) \
+                        and line.strip() == match.group(1):
+                    fence = ""
+                output.append(line)
+            elif match and not (match.group(1)[0] == "`" and "`" in line[match.end():]):
+                fence = match.group(1)
+                output.append(line)
+            else:
+                output.append(self.rewrite_line(line))
+        return "\n".join(output)
 
-        return result
+    # reescreve vários readmes do mesmo repositório: [(caminho do hook, origem, destino)]
+    @staticmethod
+    def rewrite_files(cfg: "RemoteCfg", jobs: Iterable[Tuple[str, str, str]]):
+        for path, source_file, output_file in jobs:
+            with open(source_file) as f:
+                content = cfg.remote(path).rewrite(f.read())
+            with open(output_file, "w") as f:
+                f.write(content)
 
     @staticmethod
     def replace_remote(content: str, user: str, repo: str, path: str):
-        remote_raw    = os.path.join("https://raw.githubusercontent.com", user, repo, "master" , path)
-        remote_view    = os.path.join("https://github.com/", user, repo, "blob/master", path)
-        remote_folder = os.path.join("https://github.com/", user, repo, "tree/master", path)
-        return Remote.__replace_remote(content, remote_raw, remote_view, remote_folder)
+        return Remote(user, repo, path).rewrite(content)
 
     @staticmethod
     def run(user, repo, base, source_file, output_file):
         content = open(source_file).read()
         content = Remote.replace_remote(content, user, repo, base)
         open(output_file, "w").write(content)
-        
-        #print("    Remote Readme created for " + os.path.join(base, output_file))
+
+
+class RemoteCfg:
+    # remote.cfg já carregados, indexados pelo caminho absoluto
+    cache: Dict[str, "RemoteCfg"] = {}
+
+    def __init__(self, user: str, repo: str, base: str, branch: str = "master",
+                 templates: Optional[Dict[str, str]] = None):
+        self.user = user
+        self.repo = repo
+        self.base = base
+        self.branch = branch
+        self.templates: Dict[str, str] = templates or {}
+        self.remotes: Dict[str, Remote] = {}
+
+    # Remote já preparado para um caminho do repositório
+    def remote(self, path: str) -> Remote:
+        if path not in self.remotes:
+            self.remotes[path] = Remote(self.user, self.repo, path, self.branch, self.templates)
+        return self.remotes[path]
+
+    # o remote.cfg fica na raiz do repositório, dois níveis acima do hook
+    @staticmethod
+    def find(hook_folder: str) -> str:
+        return os.path.normpath(os.path.join(os.path.abspath(hook_folder), "..", "..", "remote.cfg"))
+
+    @staticmethod
+    def load(cfg: str) -> Optional["RemoteCfg"]:
+        if cfg in RemoteCfg.cache:
+            return RemoteCfg.cache[cfg]
+        if not os.path.isfile(cfg):
+            return None
+        config = configparser.ConfigParser()
+        config.read(cfg)
+        section = config["DEFAULT"]
+        # branch e os modelos de url raw, view e folder são opcionais
+        templates = {kind: section[kind] for kind in Remote.templates if kind in section}
+        remote = RemoteCfg(section["user"], section["rep"], section["base"], section.get("branch", "master"), templates)
+        RemoteCfg.cache[cfg] = remote
+        return remote
 
 
 class HookRemote:
@@ -122,43 +334,39 @@ class HookRemote:
         return lines
 
     @staticmethod
-    def run(source, target) -> bool:
-        config = configparser.ConfigParser()
-
-        cfg = "../../remote.cfg"
-
-        if not os.path.isfile(cfg):
+    def run(source, target, cfg: Optional[RemoteCfg], hook: str) -> bool:
+        if cfg is None:
             print("no remote.cfg found")
             return False
 
-        config.read(cfg)
-
-        user = config["DEFAULT"]["user"]
-        repo = config["DEFAULT"]["rep"]
-        base = config["DEFAULT"]["base"]
+        user = cfg.user
+        repo = cfg.repo
+        base = cfg.base
 
-        hook = os.path.basename(os.getcwd())
         remote = os.path.join(base, hook)
     
-        lines = open(source).read().split("\n")
+        rewriter = cfg.remote(remote)
+        with open(source) as f:
+            lines = rewriter.rewrite(f.read()).split("\n")
         # lines = replace_title(lines, hook)
-        online_readme_link = os.path.join("https://github.com", user, repo, "blob/master", remote, "Readme.md")
+        online_readme_link = rewriter.urls["view"] + "Readme.md"
         hook = remote.split("/")[-1]
         tkodown = "tko down " + user[6:] + " " + hook
         lines = HookRemote.insert_online_link(lines, online_readme_link, tkodown)
-        open(target, "w").write("\n".join(lines))
-        Remote.run(user, repo, remote, source, target)
+        with open(target, "w") as f:
+            f.write("\n".join(lines))
         return True
 
 class Title:
+    # com o índice do repositório, o Readme só é lido se mudou desde a última consulta
     @staticmethod
-    def extract_title(readme_file):
-        title = open(readme_file).read().split("\n")[0]
-        parts = title.split(" ")
-        if parts[0].count("#") == len(parts[0]):
-            del parts[0]
-        title = " ".join(parts)
-        return title
+    def extract_title(readme_file, db: Optional[HookDB] = None):
+        if db is not None:
+            readme = db.readme(readme_file)
+            if readme is not None:
+                return readme.title
+        with open(readme_file) as f:
+            return HookDB.title(f.readline().rstrip("\n"))
 
 
 class CssStyle:
@@ -173,10 +381,18 @@ class CssStyle:
         return CssStyle.path
 
 class HTML:
+    # "pandoc" ou "python", o renderizador embutido que volta ao pandoc se não suportar o Readme
+    engine = "pandoc"
 
     @staticmethod
     def generate_html(input_file: str, output_file: str, enable_latex: bool):
         title = Title.extract_title(input_file)
+        if HTML.engine == "python":
+            try:
+                MdHtml.convert(input_file, output_file, title, CssStyle.data, enable_latex)
+                return
+            except Unsupported as e:
+                Log.print("pandoc fallback:", e)
         fulltitle = title.replace('!', '\\!').replace('?', '\\?')
         cmd = ["pandoc", input_file, '--css', CssStyle.get_file(), '--metadata', 'pagetitle=' + fulltitle,
             '-s', '-o', output_file]
@@ -190,17 +406,39 @@ class HTML:
                 print(stderr)
         except Exception as e:
             print("Erro no comando pandoc:", e)
-            exit(1)
+            sys.exit(1)
 
 # Format used to send additional files to VPL
+# guarda apenas o caminho, o conteúdo é lido quando o json é escrito
 class JsonFile:
-    def __init__(self, name: str, contents: str):
+    # extensões tratadas como binárias sem olhar o conteúdo
+    binary_extensions = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".pdf", ".zip", ".gz", ".tgz",
+                         ".bz2", ".xz", ".7z", ".tar", ".jar", ".class", ".o", ".so", ".exe", ".bin", ".npy"}
+
+    def __init__(self, name: str, path: str):
         self.name: str = name
-        self.contents: str = contents
-        self.encoding: int = 0
+        self.path: str = path
+        self.encoding: int = JsonFile.detect(path) # 0 texto, 1 base64 no formato do vpl
+
+    # binário pela extensão, por bytes nulos ou por não ser utf-8 válido, lido em blocos
+    @staticmethod
+    def detect(path: str) -> int:
+        if os.path.splitext(path)[1].lower() in JsonFile.binary_extensions:
+            return 1
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(JsonWriter.chunk_size), b""):
+                    if b"\0" in block:
+                        return 1
+                    decoder.decode(block)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return 1
+        return 0
 
     def __str__(self):
-        return self.name + ":" + self.contents + ":" + str(self.encoding)
+        return self.name + ":" + self.path + ":" + str(self.encoding)
 
 class JsonFileType(enum.Enum):
     UPLOAD = 1
@@ -208,25 +446,130 @@ class JsonFileType(enum.Enum):
     REQUIRED = 3
 
 
+# base64 dos arquivos binários guardado em folder/<sha1>, reaproveitado entre builds
+# index.json guarda [tamanho, mtime_ns, sha1] de cada arquivo para não recalcular o hash
+class Base64Cache:
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.index_file = os.path.join(folder, "index.json")
+        self.old: Dict[str, List] = Manifest.load(self.index_file)
+        self.index: Dict[str, List] = {}
+
+    def write(self, out: TextIO, path: str):
+        name = os.path.relpath(path, self.folder)
+        entry = Fingerprint.entry(path, self.old.get(name))
+        self.index[name] = entry
+        cached = os.path.join(self.folder, entry[2])
+        if os.path.isfile(cached):
+            with open(cached) as f:
+                shutil.copyfileobj(f, out, JsonWriter.chunk_size)
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        with open(cached + ".tmp", "w") as f:
+            JsonWriter.encode(path, [out, f])
+        os.replace(cached + ".tmp", cached)
+
+    # grava o índice e apaga os conteúdos que nenhum arquivo usa mais
+    def save(self):
+        if not os.path.isdir(self.folder):
+            return
+        Manifest.save(self.index_file, self.index)
+        used = set(entry[2] for entry in self.index.values())
+        for name in os.listdir(self.folder):
+            if name != "index.json" and name not in used:
+                os.remove(os.path.join(self.folder, name))
+
+
+# escreve o json no mesmo formato de json.dumps(indent=4) sem montar o documento na memória
+class JsonWriter:
+    chunk_size = 1 << 16
+    base64_chunk = 3 * (1 << 16) # múltiplo de 3, os blocos codificados se emendam sem padding
+
+    @staticmethod
+    def pad(level: int) -> str:
+        return "    " * level
+
+    # conteúdo do arquivo como string json, escapado bloco a bloco
+    @staticmethod
+    def file_string(out: TextIO, path: str):
+        out.write('"')
+        with open(path) as f:
+            for chunk in iter(lambda: f.read(JsonWriter.chunk_size), ""):
+                out.write(json.dumps(chunk)[1:-1])
+        out.write('"')
+
+    @staticmethod
+    def encode(path: str, outs: List[TextIO]):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(JsonWriter.base64_chunk), b""):
+                text = base64.b64encode(block).decode("ascii")
+                for out in outs:
+                    out.write(text)
+
+    # conteúdo binário em base64, que não precisa de escape no json
+    @staticmethod
+    def file_base64(out: TextIO, path: str, cache: Optional[Base64Cache]):
+        out.write('"')
+        if cache is not None:
+            cache.write(out, path)
+        else:
+            JsonWriter.encode(path, [out])
+        out.write('"')
+
+    @staticmethod
+    def file(out: TextIO, jfile: JsonFile, level: int, cache: Optional[Base64Cache] = None):
+        inner = JsonWriter.pad(level + 1)
+        out.write("{\n" + inner + '"name": ' + json.dumps(jfile.name) + ",\n" + inner + '"contents": ')
+        if jfile.encoding == 1:
+            JsonWriter.file_base64(out, jfile.path, cache)
+        else:
+            JsonWriter.file_string(out, jfile.path)
+        out.write(",\n" + inner + '"encoding": ' + json.dumps(jfile.encoding) + "\n" + JsonWriter.pad(level) + "}")
+
+    @staticmethod
+    def file_list(out: TextIO, files: List[JsonFile], level: int, cache: Optional[Base64Cache] = None):
+        if len(files) == 0:
+            out.write("[]")
+            return
+        out.write("[")
+        for i, jfile in enumerate(files):
+            out.write(("\n" if i == 0 else ",\n") + JsonWriter.pad(level + 1))
+            JsonWriter.file(out, jfile, level + 1, cache)
+        out.write("\n" + JsonWriter.pad(level) + "]")
+
+    @staticmethod
+    def file_dict(out: TextIO, files: Dict[str, List[JsonFile]], level: int, cache: Optional[Base64Cache] = None):
+        if len(files) == 0:
+            out.write("{}")
+            return
+        out.write("{")
+        for i, key in enumerate(files):
+            out.write(("\n" if i == 0 else ",\n") + JsonWriter.pad(level + 1) + json.dumps(key) + ": ")
+            JsonWriter.file_list(out, files[key], level + 1, cache)
+        out.write("\n" + JsonWriter.pad(level) + "}")
+
+
 class JsonVPL:
-    def __init__(self, title: str, description: str):
+    def __init__(self, title: str, description_file: str):
         self.title: str = title
-        self.description: str = description
+        self.description_file: str = description_file
         self.upload: List[JsonFile] = []
         self.keep: List[JsonFile] = []
         self.required: List[JsonFile] = []
         self.draft: Dict[str, List[JsonFile]] = {}
+        self.cache: Optional[Base64Cache] = None
 
     def __add_file(self, ftype: JsonFileType, exec_file: str, rename=""):
-        with open(exec_file) as f:
-            file_name = rename if rename != "" else exec_file.split(os.sep)[-1]
-            jfile = JsonFile(file_name, f.read())
-            if ftype == JsonFileType.UPLOAD:
-                self.upload.append(jfile)
-            elif ftype == JsonFileType.KEEP:
-                self.keep.append(jfile)
-            else:
-                self.required.append(jfile)
+        if not os.path.isfile(exec_file):
+            raise FileNotFoundError(exec_file)
+        file_name = rename if rename != "" else exec_file.split(os.sep)[-1]
+        jfile = JsonFile(file_name, exec_file)
+        if ftype == JsonFileType.UPLOAD:
+            self.upload.append(jfile)
+        elif ftype == JsonFileType.KEEP:
+            self.keep.append(jfile)
+        else:
+            self.required.append(jfile)
     
     def set_cases(self, exec_file: str):
         self.__add_file(JsonFileType.UPLOAD, exec_file, "vpl_evaluate.cases")
@@ -245,15 +588,31 @@ class JsonVPL:
         return self
     
     def add_draft(self, extension: str, exec_file: str):
+        if not os.path.isfile(exec_file):
+            raise FileNotFoundError(exec_file)
         if extension not in self.draft:
             self.draft[extension] = []
-        with open(exec_file) as f:
-            jfile = JsonFile(exec_file.split(os.sep)[-1], f.read())
-            self.draft[extension].append(jfile)
+        self.draft[extension].append(JsonFile(exec_file.split(os.sep)[-1], exec_file))
         return self
 
+    # chaves na mesma ordem e formato do antigo json.dumps(self.__dict__, indent=4)
+    def write(self, out: TextIO):
+        pad = JsonWriter.pad(1)
+        out.write("{\n" + pad + '"title": ' + json.dumps(self.title) + ",\n" + pad + '"description": ')
+        JsonWriter.file_string(out, self.description_file)
+        for key, files in [("upload", self.upload), ("keep", self.keep), ("required", self.required)]:
+            out.write(",\n" + pad + json.dumps(key) + ": ")
+            JsonWriter.file_list(out, files, 1, self.cache)
+        out.write(",\n" + pad + '"draft": ')
+        JsonWriter.file_dict(out, self.draft, 1, self.cache)
+        out.write("\n}")
+        if self.cache is not None:
+            self.cache.save()
+
     def to_json(self) -> str:
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
 
     def load_config_json(self, cfg_json: str, source: str):
         if os.path.isfile(cfg_json):
@@ -283,16 +642,143 @@ class JsonVPL:
     def __str__(self):
         return self.to_json()
 
-class Cases:
+# Caso de teste no formato do tko
+class Unit:
+    def __init__(self, case: str = ""):
+        self.case: str = case
+        self.input: str = ""
+        self.output: str = ""
+        self.grade: Optional[int] = None
+
+    def to_tio(self) -> str:
+        header = ">>>>>>>>" + (" " + self.case if self.case != "" else "")
+        if self.grade is not None:
+            header += " %" + str(self.grade)
+        return header + "\n" + self.input + "========\n" + self.output + "<<<<<<<<\n"
+
+    def to_vpl(self) -> str:
+        text = "case=" + self.case + "\n"
+        text += "input=" + (self.input if self.input != "" else "\n")
+        text += "output=\"" + self.output + "\"\n"
+        if self.grade is not None:
+            text += "grade reduction=" + str(self.grade).zfill(3) + "%\n"
+        return text
+
+
+# Leitura linha a linha dos formatos .tio e .vpl, um caso por vez
+class CaseParser:
+    @staticmethod
+    def __finish(line: str) -> str:
+        return line if line.endswith("\n") else line + "\n"
 
+    # também serve para os casos embutidos no Readme.md
     @staticmethod
-    def run(cases_file, source_readme, source_dir):
-        # find all files in the directory terminatig with .tio or .vpl
-        files = list(glob.iglob(source_dir + '/**', recursive=True))
-        files = [f for f in files if os.path.isfile(f)]
-        files = [f for f in files if f.endswith(".tio") or f.endswith(".vpl")]
-        cmd = " ".join(["tko", "build", cases_file, source_readme] + files)
-        output = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE)
+    def parse_tio(lines: Iterable[str]) -> Iterator[Unit]:
+        unit: Optional[Unit] = None
+        field = ""
+        buffer: List[str] = []
+        for line in lines:
+            mark = line.strip()
+            if mark.startswith(">>>>>>>>"):
+                unit = Unit(mark[8:].strip())
+                # redução de nota no fim do cabeçalho, como escrita por to_tio
+                words = unit.case.split(" ")
+                if words[-1].startswith("%") and words[-1][1:].isdigit():
+                    unit.grade = int(words[-1][1:])
+                    unit.case = " ".join(words[:-1])
+                field = "input"
+                buffer = []
+            elif unit is None:
+                continue
+            elif mark == "========" and field == "input":
+                unit.input = "".join(buffer)
+                field = "output"
+                buffer = []
+            elif mark == "<<<<<<<<" and field == "output":
+                unit.output = "".join(buffer)
+                yield unit
+                unit = None
+            else:
+                buffer.append(CaseParser.__finish(line))
+
+    @staticmethod
+    def parse_vpl(lines: Iterable[str]) -> Iterator[Unit]:
+        unit: Optional[Unit] = None
+        field = ""
+        buffer: List[str] = []
+
+        def close(unit: Unit):
+            text = "".join(buffer)
+            if field == "input":
+                # "input=" sozinho na linha é entrada vazia
+                unit.input = text if text != "\n" else ""
+            elif field == "output":
+                # linhas em branco entre o fim da saída e o próximo caso não fazem parte dela
+                end = len(buffer)
+                while end > 1 and buffer[end - 1].strip() == "":
+                    end -= 1
+                text = "".join(buffer[:end])
+                text = text[:-1] if text.endswith("\n") else text
+                if text.startswith("\"") and text.endswith("\"") and len(text) > 1:
+                    text = text[1:-1]
+                unit.output = CaseParser.__finish(text) if text != "" else ""
+
+        for line in lines:
+            if line.startswith("case="):
+                if unit is not None:
+                    close(unit)
+                    yield unit
+                unit = Unit(line[5:].strip())
+                field = ""
+                buffer = []
+            elif unit is None:
+                continue
+            elif line.startswith("input=") or line.startswith("output="):
+                close(unit)
+                field, value = line.split("=", 1)
+                buffer = [CaseParser.__finish(value)]
+            elif line.startswith("grade reduction="):
+                close(unit)
+                field = ""
+                unit.grade = int(line.split("=", 1)[1].strip().rstrip("%"))
+            elif field != "":
+                buffer.append(CaseParser.__finish(line))
+        if unit is not None:
+            close(unit)
+            yield unit
+
+
+class Cases:
+    # cada arquivo de entrada é convertido uma única vez para um fragmento em .cache/cases,
+    # nomeado pelo hash do conteúdo; o arquivo final é a concatenação dos fragmentos
+    @staticmethod
+    def run(cases_file: str, sources: List[str], file_hash: Callable[[str], str] = Fingerprint.file_hash):
+        to_vpl = not cases_file.endswith(".tio")
+        fragments = os.path.join(os.path.dirname(cases_file), "cases")
+        if not os.path.isdir(fragments):
+            os.makedirs(fragments)
+
+        used: List[str] = []
+        for path in sources:
+            kind = "vpl" if path.endswith(".vpl") else "tio"
+            name = file_hash(path) + "." + kind + (".vpl" if to_vpl else ".tio")
+            fragment = os.path.join(fragments, name)
+            if not os.path.isfile(fragment):
+                parse = CaseParser.parse_vpl if kind == "vpl" else CaseParser.parse_tio
+                with open(path) as fin, open(fragment + ".tmp", "w") as fout:
+                    for unit in parse(fin):
+                        fout.write((unit.to_vpl() if to_vpl else unit.to_tio()) + "\n")
+                os.replace(fragment + ".tmp", fragment)
+            used.append(fragment)
+
+        with open(cases_file, "w") as fout:
+            for fragment in used:
+                with open(fragment) as fin:
+                    shutil.copyfileobj(fin, fout)
+
+        for name in os.listdir(fragments):
+            if os.path.join(fragments, name) not in used:
+                os.remove(os.path.join(fragments, name))
 
 def norm_join(*args):
     return os.path.normpath(os.path.join(*args))
@@ -316,119 +802,149 @@ class Config:
         return False
     
 
-class Mode(enum.Enum):
-    ADD = 1 # inserir cortando por degrau
-    RAW = 2 # inserir tudo
-    DEL = 3 # apagar tudo
-    COM = 4 # inserir código removendo comentários
-
-class Filter:
-    def __init__(self, filename):
-        self.mode = Mode.RAW
-        self.backup_mode = Mode.RAW
-        self.level = 1
-        self.com = "//"
-        if filename.endswith(".py"):
-            self.com = "#"
-    
-    def init_raw(self):
-        self.mode = Mode.RAW
-        return self
-
-    def init_del(self):
-        self.mode = Mode.DEL
-        return self
+class Tree:
+    text_extensions = {".md", ".c", ".cpp", ".h", ".hpp", ".py", ".java", ".js", ".ts", ".hs", ".txt"}
 
-    # decide se a linha deve entrar no texto
-    def evaluate_insert(self, line: str):
-        if self.mode == Mode.DEL:
-            return False
-        if self.mode == Mode.RAW:
-            return True
-        if self.mode == Mode.COM:
-            return True
-        if line == "":
-            return True
-        margin = (self.level + 1) * "    "
-        if line.startswith(margin):
-            return False
+    # copia source para destiny filtrando os textos, reescrevendo só o que mudou
+    # state guarda as impressões digitais dos arquivos de source da última cópia
+    # hook_files é a varredura do hook que contém source, se já existir
+    @staticmethod
+    def deep_filter_copy(source: str, destiny: str, deep: int, state: Optional[str] = None,
+                         hook_files: Optional[HookFiles] = None):
+        os.makedirs(destiny, exist_ok=True)
+        old = Manifest.load(state) if state is not None else {}
+        if hook_files is None:
+            hook_files = HookFiles(source)
+        folder = os.path.relpath(source, hook_files.folder)
+        files = list(hook_files.walk(folder, deep))
+        new = hook_files.collect(files, old, folder)
+        for path in files:
+            target = os.path.join(destiny, path)
+            if path in old and old[path][2] == new[path][2] and os.path.isfile(target):
+                continue
+            Tree.copy_file(os.path.join(source, path), target)
+        Tree.prune(destiny, set(files))
+        if state is not None:
+            Manifest.save(state, new)
+
+    # o filtro não altera arquivos sem marcações e sem \r
+    @staticmethod
+    def is_plain(path: str) -> bool:
+        com = Filter.comment_for(path).encode()
+        with open(path, "rb") as f:
+            data = f.read()
+        return all(marker not in data for marker in [com + b"++", com + b"==", com + b"--", b"\r"])
 
-        return True
+    # arquivos que não mudam com o filtro são copiados pelo kernel, sem passar por strings
+    @staticmethod
+    def copy_file(source: str, target: str):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.splitext(source)[1] in Tree.text_extensions and not Tree.is_plain(source):
+            if Filter.filter_file(source, target):
+                Log.print("(filtered):", target)
+            return
+        if os.path.isfile(target) and filecmp.cmp(source, target, shallow=False):
+            return
+        shutil.copyfile(source, target)
+        Log.print("(        ):", target)
 
-    def process(self, content: str) -> str:
-        lines = content.split("\n")
-        output = []
-        for line in lines:
-            alone = len(line.split(" ")) == 1
-            two_words = len(line.strip().split(" ")) == 2
-            if self.mode == Mode.COM:
-                if not line.strip().startswith(self.com):
-                    self.mode = self.backup_mode
-            if two_words and line.endswith("$$") and self.mode == Mode.ADD:
-                self.backup_mode = self.mode
-                self.mode = Mode.COM
-            elif line[-(3 + len(self.com)):-1] == self.com + "++":
-                self.mode = Mode.ADD
-                self.level = int(line[-1])
-            elif line == self.com + "==":
-                self.mode = Mode.RAW
-            elif line == self.com + "--":
-                self.mode = Mode.DEL
-            elif self.evaluate_insert(line):
-                if self.mode == Mode.COM:
-                    line = line.replace(self.com + " ", "", 1)
-                output.append(line)
-        return "\n".join(output)
+    # remove de destiny o que não existe mais na origem
+    @staticmethod
+    def prune(destiny: str, keep: Set[str], prefix: str = ""):
+        with os.scandir(destiny) as it:
+            entries = list(it)
+        for entry in entries:
+            path = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                Tree.prune(entry.path, keep, path + os.sep)
+                if len(os.listdir(entry.path)) == 0:
+                    os.rmdir(entry.path)
+            elif path not in keep:
+                os.remove(entry.path)
+
+    # rascunhos por linguagem a partir da pasta lang já gerada: {lang: [arquivos]}
+    @staticmethod
+    def draft_tree(cache_lang: str) -> Dict[str, List[str]]:
+        tree: Dict[str, List[str]] = {}
+        if not os.path.isdir(cache_lang):
+            return tree
+        for lang in sorted(os.listdir(cache_lang)):
+            folder = os.path.join(cache_lang, lang)
+            if os.path.isdir(folder):
+                files = [f for f in sorted(os.listdir(folder))
+                         if not f.startswith(".") and os.path.isfile(os.path.join(folder, f))]
+                if len(files) > 0:
+                    tree[lang] = files
+        return tree
+
+    # todos os arquivos abaixo de folder, relativos a source
+    @staticmethod
+    def list_files(source: str, folder: str) -> List[str]:
+        output: List[str] = []
+        for root, _dirs, names in os.walk(norm_join(source, folder)):
+            for name in names:
+                output.append(os.path.relpath(os.path.join(root, name), source))
+        return sorted(output)
+
+class Stage:
+    # inputs e outputs são relativos à pasta do hook, deps são as etapas anteriores
+    def __init__(self, name: str, run: Callable[[], None], inputs: Callable[[], List[str]], outputs: List[str],
+                 deps: List[str]):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.deps = deps
+
+
+# sys.stdout que separa a saída de cada thread enquanto as etapas rodam juntas
+class StageOutput(io.TextIOBase):
+    local = threading.local()
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        buffer = getattr(StageOutput.local, "buffer", None)
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def flush(self):
+        if getattr(StageOutput.local, "buffer", None) is None:
+            self.stream.flush()
 
-class Tree:
     @staticmethod
-    def deep_filter_copy(source, dict_tree, destiny, deep: int):
-        if deep == 0:
-            return
-        if os.path.isdir(source):
-            chain = source.split(os.sep)
-            if len(chain) > 1 and chain[-1].startswith("."):
-                return
-            if not os.path.isdir(destiny):
-                os.makedirs(destiny)
-            for file in sorted(os.listdir(source)):
-                Tree.deep_filter_copy(os.path.join(source, file), dict_tree, os.path.join(destiny, file), deep - 1)
-        else:
-            filename = os.path.basename(source)
-            text_extensions = [".md", ".c", ".cpp", ".h", ".hpp", ".py", ".java", ".js", ".ts", ".hs", ".txt"]
-            pieces = source.split(os.sep)
-            if len(pieces) >= 3:
-                if pieces[-3] == "src":
-                    if pieces[-2] not in dict_tree:
-                        dict_tree[pieces[-2]] = []
-                    dict_tree[pieces[-2]].append(pieces[-1])
-
-            if not any([filename.endswith(ext) for ext in text_extensions]):
-                return
-            content = open(source, "r").read()
-            processed = Filter(filename).process(content)
-            with open(destiny, "w") as f:
-                if processed != content:
-                    Log.print("(filtered): ", end="")
-                else:
-                    Log.print("(        ): ", end="")
-                f.write(processed)
-                Log.print(destiny)
+    @contextlib.contextmanager
+    def capture() -> Iterator[io.StringIO]:
+        StageOutput.local.buffer = io.StringIO()
+        try:
+            yield StageOutput.local.buffer
+        finally:
+            StageOutput.local.buffer = None
+
 
 class Action:
+    stage_jobs = 3 # etapas independentes rodando ao mesmo tempo
+
     def __init__(self, source):
-        self.cache = ".cache"
-        self.target = norm_join(self.cache, "mapi.json")
         self.source = source
-        self.hook = os.path.basename(os.getcwd())
+        self.cache = norm_join(self.source, ".cache")
+        self.target = norm_join(self.cache, "mapi.json")
+        self.hook = os.path.basename(os.path.abspath(self.source))
         self.source_readme = norm_join(self.source, "Readme.md")
         self.remote_readme = norm_join(self.cache, "Readme.md")
+        self.remote_cfg = RemoteCfg.find(self.source)
         self.description = norm_join(self.cache, "q.html")
-        self.title = Title.extract_title(self.source_readme)
+        # o índice fica na raiz do repositório, ao lado do remote.cfg
+        self.db = HookDB.open(os.path.dirname(self.remote_cfg)) if os.path.isfile(self.remote_cfg) else None
+        self.title = Title.extract_title(self.source_readme, self.db)
         self.cases = norm_join(self.cache, "q.tio")
         self.config_json = norm_join(self.source, "config.json")
-        self.mapi_json = norm_join(source, self.cache, "mapi.json")
+        self.mapi_json = norm_join(self.cache, "mapi.json")
+        self.manifest = norm_join(self.cache, "manifest.json")
         self.draft_tree = {}
+        self.files: Optional[HookFiles] = None
+        self.scan: Tuple[List[str], List[str]] = ([], [])
+        self.config_files: List[str] = []
         self.cache_src = "lang"
         self.vpl = None
 
@@ -438,17 +954,49 @@ class Action:
             os.makedirs(self.cache)
         return self
     
-    def recreate_cache(self):
-        shutil.rmtree(self.cache)
-        os.makedirs(self.cache)
-        return self
-    
-    def check_rebuild(self):
-        [_path, changes_found] = Check.check_rebuild(self.source, self.target)
-        return changes_found
-    
+    # grafo de etapas em ordem topológica, cada etapa com suas entradas e saídas
+    def stages(self) -> List[Stage]:
+        cache = ".cache"
+        cache_lang = os.path.join(cache, self.cache_src)
+        outputs = Action.outputs(self.source)
+        return [
+            Stage("remote", self.remote, lambda: ["Readme.md", os.path.join("..", "..", "remote.cfg")],
+                  outputs["remote"], []),
+            Stage("html", self.html, lambda: [os.path.join(cache, "Readme.md")], outputs["html"], ["remote"]),
+            Stage("cases", self.build_cases, lambda: ["Readme.md"] + self.scan[1], outputs["cases"], []),
+            Stage("drafts", self.copy_drafts, lambda: self.scan[0], outputs["drafts"], []),
+            # o local.sh pode depender de qualquer arquivo do hook e pode ler ou alterar as saídas
+            # das etapas anteriores, então roda depois de todas elas; o pandoc ainda corre junto
+            # com cases e drafts
+            Stage("local", self.run_local_sh, lambda: Manifest.inputs(self.scan, self.config_files), outputs["local"],
+                  ["remote", "html", "cases", "drafts"]),
+            Stage("mapi", self.mapi, lambda: ["Readme.md", "config.json", os.path.join(cache, "q.html"),
+                                              os.path.join(cache, "q.tio")]
+                  + self.config_files + Tree.list_files(self.source, cache_lang),
+                  outputs["mapi"], ["html", "cases", "drafts", "local"]),
+        ]
+
+    # saídas de cada etapa, relativas ao hook; a pasta lang só existe se o hook tiver src
+    @staticmethod
+    def outputs(source: str) -> Dict[str, List[str]]:
+        cache = ".cache"
+        has_src = os.path.isdir(os.path.join(source, "src"))
+        return {
+            "remote": [os.path.join(cache, "Readme.md")],
+            "html": [os.path.join(cache, "q.html")],
+            "cases": [os.path.join(cache, "q.tio")],
+            "drafts": [os.path.join(cache, "lang")] if has_src else [],
+            "local": [],
+            "mapi": [os.path.join(cache, "mapi.json")],
+        }
+
+    def is_dirty(self, stage: Stage, old: Dict[str, List], new: Dict[str, List]) -> bool:
+        if any(not os.path.exists(norm_join(self.source, output)) for output in stage.outputs):
+            return True
+        return Fingerprint.changed(new, old) is not None
+
     def remote(self):
-        HookRemote.run(self.source_readme, self.remote_readme)
+        HookRemote.run(self.source_readme, self.remote_readme, RemoteCfg.load(self.remote_cfg), self.hook)
         Log.write("RemoteMd ")
     
     def html(self):
@@ -456,68 +1004,264 @@ class Action:
         Log.write("HTML ")
 
     def build_cases(self):
-        Cases.run(self.cases, self.source_readme, self.source)
+        Cases.run(self.cases, [self.source_readme] + [norm_join(self.source, f) for f in self.scan[1]],
+                  lambda path: self.files.hash(os.path.relpath(path, self.source)))
         Log.write("Cases ")
 
     def copy_drafts(self):
         src_folder = norm_join(self.source, "src")
-        if os.path.isdir(src_folder):
-            Tree.deep_filter_copy(src_folder, self.draft_tree, norm_join(self.source, self.cache, self.cache_src), 5)
+        cache_lang = norm_join(self.cache, self.cache_src)
+        if self.files.isdir("src"):
+            Tree.deep_filter_copy(src_folder, cache_lang, 5, cache_lang + ".json", self.files)
+        elif os.path.isdir(cache_lang):
+            shutil.rmtree(cache_lang)
 
     def run_local_sh(self):
         local_sh = norm_join(self.source, "local.sh")
         if os.path.isfile(local_sh):
-            subprocess.run("bash " + local_sh, shell=True)
+            # stderr junto com stdout, para sair no buffer da etapa sem se misturar às outras
+            output = subprocess.run(["bash", "local.sh"], cwd=self.source, stdout=PIPE, stderr=subprocess.STDOUT,
+                                    universal_newlines=True)
+            print(output.stdout, end="")
 
     def init_vpl(self):
-        self.vpl = JsonVPL(self.title, open(self.description).read())
+        self.vpl = JsonVPL(self.title, self.description)
+        self.vpl.cache = Base64Cache(norm_join(self.cache, "base64"))
         self.vpl.set_cases(self.cases)
         if self.vpl.load_config_json(self.config_json, self.source):
             Log.write("Required ")
+        self.draft_tree = Tree.draft_tree(norm_join(self.cache, self.cache_src))
         if self.vpl.load_draft_tree(self.draft_tree, norm_join(self.cache, self.cache_src)):
             Log.write("Drafts ")
-        Log.write("] ")
 
     def create_mapi(self):
-        open(self.mapi_json, "w").write(str(self.vpl) + "\n")
-        Log.write("DONE")
-
-    def clean(self):
-        os.remove(self.cases)
-        os.remove(self.description)
+        with open(self.mapi_json + ".tmp", "w") as f:
+            self.vpl.write(f)
+            f.write("\n")
+        os.replace(self.mapi_json + ".tmp", self.mapi_json)
+        Log.write("Mapi ")
+
+    def mapi(self):
+        self.init_vpl()
+        self.create_mapi()
+
+    # run mdpp on source readme, no mesmo processo, listando os rascunhos pela varredura do hook
+    # retorna se o mdpp reprocessou o Readme e pode ter alterado arquivos do hook
+    def update_markdown(self) -> bool:
+        try:
+            with self.files.shared():
+                return mdpp.process([self.source_readme], mdpp.Action.RUN) > 0
+        except Exception as e:
+            print("mdpp error:", repr(e))
+            return True
 
-    # run mdpp script on source readme
-    def update_markdown(self):
-        subprocess.run("mdpp " + self.source_readme, shell=True)
+    # arquivos de entrada a partir da varredura atual do hook
+    def __scan(self):
+        self.scan = Manifest.scan(self.files)
+        self.config_files = Manifest.config_files(self.source)
+
+    # arquivo do cProfile quando a etapa foi escolhida com --cprofile
+    def __prof_file(self, stage: str) -> Optional[str]:
+        if not Profiler.enabled or Profiler.cprofile != stage:
+            return None
+        return norm_join(self.cache, "profile." + stage + ".prof")
+
+    # roda as etapas cujas entradas mudaram, retorna se algo foi refeito
+    def build(self, check: bool, markdown: bool = True) -> bool:
+        with Profiler.span(self.hook, "hook", self.hook):
+            return self.__build(check, markdown)
+
+    def __build(self, check: bool, markdown: bool) -> bool:
+        self.create_cache()
+        # uma varredura do hook para todas as etapas, refeita só se mdpp ou local.sh mexerem nele
+        self.files = HookFiles(self.source)
+        if markdown:
+            with Profiler.span("mdpp", "stage", self.hook, self.__prof_file("mdpp")):
+                if self.update_markdown():
+                    self.files.refresh()
+        self.__scan()
+        records = Manifest.load(self.manifest).get("stages", {})
+        todo = self.stages()
+        # com o profiler as etapas rodam uma por vez para não misturar cpu e io entre elas
+        jobs = 1 if Profiler.enabled else Action.stage_jobs
+
+        done: Set[str] = set()
+        outputs: Dict[str, str] = {}
+        running: Dict[concurrent.futures.Future, Tuple[Stage, Dict[str, List]]] = {}
+        error: Optional[BaseException] = None
+        started = False
+        printed = 0
+        stdout = sys.stdout
+        sys.stdout = StageOutput(stdout)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+                while True:
+                    # agenda as etapas cujas anteriores já terminaram, até não sobrar nenhuma pronta
+                    scheduled = True
+                    while scheduled and error is None:
+                        scheduled = False
+                        busy = set(stage.name for stage, _ in running.values())
+                        for stage in todo:
+                            if stage.name in done or stage.name in busy:
+                                continue
+                            if any(name not in done for name in stage.deps):
+                                continue
+                            old = records.get(stage.name, {})
+                            new = self.files.collect(stage.inputs(), old)
+                            if check and stage.name in records and not self.is_dirty(stage, old, new):
+                                records[stage.name] = new
+                                outputs[stage.name] = ""
+                                done.add(stage.name)
+                            else:
+                                if not started:
+                                    Log.write(self.hook, ": Changes found [ ")
+                                    started = True
+                                running[pool.submit(self.__run_stage, stage)] = (stage, new)
+                                busy.add(stage.name)
+                            scheduled = True
+
+                    if len(running) == 0:
+                        break
+                    finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in finished:
+                        stage, new = running.pop(future)
+                        outputs[stage.name], failure = future.result()
+                        if failure is not None:
+                            error = error or failure
+                            continue
+                        if stage.name == "local":
+                            # o local.sh pode ter criado ou alterado arquivos do hook
+                            self.files.refresh()
+                            self.__scan()
+                            new = self.files.collect(stage.inputs(), new)
+                        records[stage.name] = new
+                        done.add(stage.name)
+
+                    # a saída de cada etapa sai inteira e na ordem declarada
+                    while printed < len(todo) and todo[printed].name in outputs:
+                        stdout.write(outputs[todo[printed].name])
+                        printed += 1
+                    stdout.flush()
+        finally:
+            sys.stdout = stdout
+        for stage in todo[printed:]:
+            print(outputs.get(stage.name, ""), end="")
+        if error is not None:
+            raise error
+        Manifest.save(self.manifest, {"stages": records})
+
+        if started:
+            Log.write("] DONE\n")
+        return started
+
+    # roda a etapa numa thread do pool, devolvendo a saída capturada e o erro, se houver
+    def __run_stage(self, stage: Stage) -> Tuple[str, Optional[BaseException]]:
+        with StageOutput.capture() as buffer:
+            try:
+                with Profiler.span(stage.name, "stage", self.hook, self.__prof_file(stage.name)):
+                    stage.run()
+                return buffer.getvalue(), None
+            except (Exception, SystemExit) as e:
+                return buffer.getvalue(), e
+
+
+class Batch:
+    # procura os hooks com Readme.md dentro da pasta base ou do glob
+    @staticmethod
+    def find_hooks(pattern: str) -> List[str]:
+        if os.path.isdir(pattern):
+            folders = [norm_join(pattern, f) for f in sorted(os.listdir(pattern))]
+        else:
+            folders = sorted(glob.glob(pattern))
+        return [f for f in folders if os.path.isfile(norm_join(f, "Readme.md"))]
 
+    @staticmethod
+    def init_worker(verbose: bool, html_engine: str, remote_cfgs: Dict[str, RemoteCfg], profile: bool,
+                    cprofile: Optional[str]):
+        Log.verbose = verbose
+        HTML.engine = html_engine
+        RemoteCfg.cache = remote_cfgs
+        Profiler.enabled = profile
+        Profiler.cprofile = cprofile
+
+    # retorna (hook, status, saída capturada, eventos do profiler)
+    @staticmethod
+    def build_hook(folder: str, check: bool) -> Tuple[str, str, str, List[Dict]]:
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                rebuilt = Action(folder).build(check)
+            return folder, "rebuilt" if rebuilt else "skipped", output.getvalue(), Profiler.take()
+        except (Exception, SystemExit) as e:
+            return folder, "failed", output.getvalue() + "error: " + repr(e) + "\n", Profiler.take()
 
-def main():
+    @staticmethod
+    def run(pattern: str, check: bool, jobs: int) -> bool:
+        hooks = Batch.find_hooks(pattern)
+        # remote.cfg é lido uma única vez por lote e repassado aos workers
+        for folder in hooks:
+            RemoteCfg.load(RemoteCfg.find(folder))
+
+        results: List[Tuple[str, str, str, List[Dict]]] = []
+        events: List[Dict] = []
+        if jobs <= 1:
+            for folder in hooks:
+                result = Batch.build_hook(folder, check)
+                print(result[2], end="", flush=True)
+                results.append(result)
+                events += result[3]
+        else:
+            initargs = (Log.verbose, HTML.engine, RemoteCfg.cache, Profiler.enabled, Profiler.cprofile)
+            with concurrent.futures.ProcessPoolExecutor(jobs, initializer=Batch.init_worker, initargs=initargs) as pool:
+                futures = [pool.submit(Batch.build_hook, folder, check) for folder in hooks]
+                for future in concurrent.futures.as_completed(futures):
+                    result = future.result()
+                    print(result[2], end="", flush=True)
+                    results.append(result)
+                    events += result[3]
+        Profiler.events += events
+
+        failed = sorted([folder for (folder, status, _, _) in results if status == "failed"])
+        rebuilt = len([r for r in results if r[1] == "rebuilt"])
+        skipped = len([r for r in results if r[1] == "skipped"])
+        print("Hooks:", len(results), "Rebuilt:", rebuilt, "Up to date:", skipped, "Failed:", len(failed))
+        for folder in failed:
+            print("  failed:", folder)
+        return len(failed) == 0
+
+
+def main(argv: Optional[List[str]] = None):
 
     args = argparse.ArgumentParser()
-    args.add_argument("--check", "-c", action="store_true", help="Check if the file needs to be rebuilt")
+    args.add_argument("--check", "-c", action="store_true", help="Rebuild only the stages whose inputs changed")
     args.add_argument("--verbose", "-v", action="store_true", help="Prints the output of the commands")
-    args = args.parse_args()
+    args.add_argument("--batch", "-b", type=str, metavar="BASE", help="Build all hooks inside a base folder or glob")
+    args.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Number of parallel workers in batch mode")
+    args.add_argument("--html", type=str, choices=["pandoc", "python"], default="pandoc",
+                      help="Html renderer, python falls back to pandoc on unsupported markdown")
+    args.add_argument("--profile", type=str, metavar="TRACE", help="Write a Chrome trace of the stages and print a summary")
+    args.add_argument("--cprofile", type=str, metavar="STAGE",
+                      choices=["mdpp", "remote", "html", "cases", "drafts", "local", "mapi"],
+                      help="With --profile, run this stage under cProfile into .cache/profile.STAGE.prof")
+    args = args.parse_args(argv)
 
-    action = Action(".").create_cache()
     Log.verbose = args.verbose
+    HTML.engine = args.html
+    Profiler.enabled = args.profile is not None
+    Profiler.cprofile = args.cprofile
 
-    action.update_markdown()
-
-    if args.check and not action.check_rebuild():
-        return
-
-    action.recreate_cache()
-    Log.write(action.hook, ": Changes found [ ")
-    action.remote()
-    action.html()
-    action.build_cases()
-    action.copy_drafts()
-    action.run_local_sh()
-    action.init_vpl()
-    action.create_mapi()
-    Log.write("\n")
-    action.clean()
+    ok = True
+    if args.batch is not None:
+        ok = Batch.run(args.batch, args.check, args.jobs)
+    else:
+        Action(".").build(args.check)
 
+    if args.profile is not None:
+        Profiler.save(args.profile)
+        print(Profiler.summary())
+    if not ok:
+        sys.exit(1)
 
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
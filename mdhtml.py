@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Renderizador de markdown para html sem subprocessos.
+# Cobre o subconjunto usado nos Readmes dos hooks e gera a mesma estrutura de
+# página que o pandoc. Construções fora desse subconjunto levantam Unsupported
+# para que o chamador volte a usar o pandoc.
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+import html.parser
+from typing import List, Tuple, Dict, Optional
+
+
+class Unsupported(Exception):
+    pass
+
+
+class Inline:
+    code_re = re.compile(r"(`+)(.+?)(?<!`)\1(?!`)", re.DOTALL)
+    escape_re = re.compile(r"\\([!\"#$%&'()*+,\-./:;<=>?@\[\\\]^_`{|}~])")
+    display_math_re = re.compile(r"\$\$(.+?)\$\$", re.DOTALL)
+    math_re = re.compile(r"\$(?![\s$])((?:[^$\\]|\\.)+?)(?<!\s)\$(?!\d)")
+    image_re = re.compile(r"!\[((?:[^\[\]]|\[[^\]]*\])*)\]\(\s*<?([^)\s>]*)>?(?:\s+\"([^\"]*)\")?\s*\)")
+    link_re = re.compile(r"\[((?:[^\[\]]|\[[^\]]*\])*)\]\(\s*<?([^)\s>]*)>?(?:\s+\"([^\"]*)\")?\s*\)")
+    autolink_re = re.compile(r"<((?:https?|ftp|mailto):[^>\s]+)>")
+    tag_re = re.compile(r"</?[a-zA-Z][^>]*>|<!--.*?-->", re.DOTALL)
+    break_re = re.compile(r"(?:  +|\\)\n")
+    strong_re = re.compile(r"\*\*(?!\s)(.+?)(?<!\s)\*\*|(?<![\w])__(?!\s)(.+?)(?<!\s)__(?![\w])", re.DOTALL)
+    em_re = re.compile(r"\*(?![\s*])(.+?)(?<![\s*])\*|(?<![\w])_(?![\s_])(.+?)(?<![\s_])_(?![\w])", re.DOTALL)
+    del_re = re.compile(r"~~(?!\s)(.+?)(?<!\s)~~", re.DOTALL)
+    holder_re = re.compile("\x00(\\d+)\x00")
+
+    @staticmethod
+    def escape(text: str) -> str:
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+    @staticmethod
+    def escape_attr(text: str) -> str:
+        return Inline.escape(text).replace("\"", "&quot;")
+
+    # aspas e traços tipográficos, como a extensão smart do pandoc
+    @staticmethod
+    def smart(text: str) -> str:
+        text = text.replace("---", "\u2014").replace("--", "\u2013").replace("...", "\u2026")
+        text = re.sub(r"(^|[\s(\[{\u2014\u2013\x00])\"", "\\1\u201c", text)
+        text = text.replace("\"", "\u201d")
+        text = re.sub(r"(^|[\s(\[{\u2014\u2013\x00])'", "\\1\u2018", text)
+        text = text.replace("'", "\u2019")
+        return text
+
+    def __init__(self):
+        self.holders: List[str] = []
+
+    def __hold(self, html_text: str) -> str:
+        self.holders.append(html_text)
+        return "\x00" + str(len(self.holders) - 1) + "\x00"
+
+    def __restore(self, text: str) -> str:
+        while "\x00" in text:
+            text = Inline.holder_re.sub(lambda m: self.holders[int(m.group(1))], text)
+        return text
+
+    def __link(self, match: re.Match, image: bool) -> str:
+        label, url, title = match.group(1), match.group(2), match.group(3)
+        attr_title = "" if title is None else " title=\"" + Inline.escape_attr(title) + "\""
+        if image:
+            return self.__hold("<img src=\"" + Inline.escape_attr(url) + "\"" + attr_title +
+                               " alt=\"" + Inline.escape_attr(Inline.plain(label)) + "\" />")
+        inner = self.__render(label)
+        return self.__hold("<a href=\"" + Inline.escape_attr(url) + "\"" + attr_title + ">" + inner + "</a>")
+
+    def __render(self, text: str) -> str:
+        if "[^" in text:
+            raise Unsupported("footnote")
+        text = Inline.code_re.sub(lambda m: self.__hold("<code>" + Inline.escape(m.group(2).strip()) + "</code>"), text)
+        text = Inline.escape_re.sub(lambda m: self.__hold(Inline.escape(m.group(1))), text)
+        text = Inline.display_math_re.sub(
+            lambda m: self.__hold("<span class=\"math display\">\\[" + Inline.escape(m.group(1)) + "\\]</span>"), text)
+        text = Inline.math_re.sub(
+            lambda m: self.__hold("<span class=\"math inline\">\\(" + Inline.escape(m.group(1)) + "\\)</span>"), text)
+        text = Inline.image_re.sub(lambda m: self.__link(m, True), text)
+        text = Inline.link_re.sub(lambda m: self.__link(m, False), text)
+        text = Inline.autolink_re.sub(lambda m: self.__hold("<a href=\"" + Inline.escape_attr(m.group(1)) +
+                                                            "\" class=\"uri\">" + Inline.escape(m.group(1)) + "</a>"), text)
+        text = Inline.tag_re.sub(lambda m: self.__hold(m.group(0)), text)
+        text = Inline.break_re.sub(lambda m: self.__hold("<br />\n"), text)
+        text = Inline.smart(Inline.escape(text))
+        text = Inline.strong_re.sub(lambda m: "<strong>" + (m.group(1) or m.group(2)) + "</strong>", text)
+        text = Inline.em_re.sub(lambda m: "<em>" + (m.group(1) or m.group(2)) + "</em>", text)
+        text = Inline.del_re.sub(lambda m: "<del>" + m.group(1) + "</del>", text)
+        return text
+
+    def render(self, text: str) -> str:
+        return self.__restore(self.__render(text))
+
+    # texto sem marcação, usado no alt das imagens e nos ids dos títulos
+    @staticmethod
+    def plain(text: str) -> str:
+        text = Inline.code_re.sub(lambda m: m.group(2).strip(), text)
+        text = Inline.image_re.sub(lambda m: m.group(1), text)
+        text = Inline.link_re.sub(lambda m: m.group(1), text)
+        text = Inline.escape_re.sub(lambda m: m.group(1), text)
+        text = Inline.tag_re.sub("", text)
+        text = Inline.strong_re.sub(lambda m: m.group(1) or m.group(2), text)
+        text = Inline.em_re.sub(lambda m: m.group(1) or m.group(2), text)
+        return Inline.del_re.sub(lambda m: m.group(1), text)
+
+
+class MdHtml:
+    fence_re = re.compile(r"^( {0,3})(`{3,}|~{3,})\s*\{?\.?([^`\s}]*)")
+    heading_re = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+    hr_re = re.compile(r"^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+    item_re = re.compile(r"^( {0,3})([-*+]|\d{1,9}[.)])( +|$)(.*)$")
+    table_sep_re = re.compile(r"^ {0,3}\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+    refdef_re = re.compile(r"^ {0,3}\[[^\]]+\]:\s")
+    setext_re = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def __identifier(self, text: str) -> str:
+        text = Inline.plain(text).lower()
+        text = "".join(c for c in text if c.isalnum() or c in "_-. \t\n")
+        text = re.sub(r"\s+", "-", text.strip())
+        text = re.sub(r"^[^a-z\u00c0-\uffff]+", "", text)
+        if text == "":
+            text = "section"
+        if text in self.ids:
+            self.ids[text] += 1
+            return text + "-" + str(self.ids[text])
+        self.ids[text] = 0
+        return text
+
+    @staticmethod
+    def __indent(line: str) -> int:
+        return len(line) - len(line.lstrip(" "))
+
+    @staticmethod
+    def __cells(line: str) -> List[str]:
+        line = line.strip()
+        if line.startswith("|"):
+            line = line[1:]
+        if line.endswith("|") and not line.endswith("\\|"):
+            line = line[:-1]
+        return [cell.strip() for cell in re.split(r"(?<!\\)\|", line)]
+
+    def __table(self, lines: List[str]) -> str:
+        header = MdHtml.__cells(lines[0])
+        aligns: List[str] = []
+        for cell in MdHtml.__cells(lines[1]):
+            if cell.startswith(":") and cell.endswith(":"):
+                aligns.append(" style=\"text-align: center;\"")
+            elif cell.endswith(":"):
+                aligns.append(" style=\"text-align: right;\"")
+            elif cell.startswith(":"):
+                aligns.append(" style=\"text-align: left;\"")
+            else:
+                aligns.append("")
+        if len(aligns) != len(header):
+            raise Unsupported("table header")
+        out = ["<table>", "<thead>", "<tr class=\"header\">"]
+        out += ["<th" + aligns[i] + ">" + Inline().render(cell) + "</th>" for i, cell in enumerate(header)]
+        out += ["</tr>", "</thead>", "<tbody>"]
+        for index, row in enumerate(lines[2:]):
+            cells = MdHtml.__cells(row) + [""] * len(aligns)
+            out.append("<tr class=\"" + ("odd" if index % 2 == 0 else "even") + "\">")
+            out += ["<td" + aligns[i] + ">" + Inline().render(cells[i]) + "</td>" for i in range(len(aligns))]
+            out.append("</tr>")
+        out += ["</tbody>", "</table>"]
+        return "\n".join(out)
+
+    # percorre uma lista a partir da linha i e retorna (html, próxima linha)
+    def __list(self, lines: List[str], i: int) -> Tuple[str, int]:
+        first = MdHtml.item_re.match(lines[i])
+        assert first is not None
+        ordered = first.group(2)[0].isdigit()
+        delimiter = first.group(2)[-1]
+        items: List[List[str]] = []
+        loose = False
+        while i < len(lines):
+            match = MdHtml.item_re.match(lines[i])
+            if match is None or match.group(2)[0].isdigit() != ordered or match.group(2)[-1] != delimiter:
+                break
+            width = len(match.group(1)) + len(match.group(2)) + (len(match.group(3)) if match.group(4) != "" else 1)
+            if len(match.group(3)) > 4:
+                width = len(match.group(1)) + len(match.group(2)) + 1
+            body = [match.group(4)]
+            i += 1
+            while i < len(lines):
+                line = lines[i]
+                if line.strip() == "":
+                    j = i
+                    while j < len(lines) and lines[j].strip() == "":
+                        j += 1
+                    if j < len(lines) and MdHtml.__indent(lines[j]) >= width:
+                        body += [""] * (j - i)
+                        i = j
+                        continue
+                    break
+                if MdHtml.__indent(line) >= width:
+                    body.append(line[width:])
+                elif MdHtml.item_re.match(line) or MdHtml.fence_re.match(line) or line.lstrip().startswith("<!--") \
+                        or body[-1] == "":
+                    break
+                else:
+                    body.append(line.strip())
+                i += 1
+            items.append(body)
+            # linha em branco antes do próximo item só deixa a lista espaçada se ele continua esta lista
+            j = i
+            while j < len(lines) and lines[j].strip() == "":
+                j += 1
+            following = MdHtml.item_re.match(lines[j]) if j > i and j < len(lines) else None
+            if following is not None and MdHtml.__indent(lines[j]) < width \
+                    and following.group(2)[0].isdigit() == ordered and following.group(2)[-1] == delimiter:
+                loose = True
+                i = j
+            if any(line == "" for line in body[:-1]):
+                loose = True
+
+        out: List[str] = []
+        for body in items:
+            blocks = self.__blocks(body, True)
+            parts = []
+            for kind, text in blocks:
+                parts.append(text if kind != "para" or loose else text[3:-4])
+            out.append("<li>" + "\n".join(parts) + "</li>")
+        start = int(first.group(2)[:-1]) if ordered else 1
+        tag = "ol" if ordered else "ul"
+        attr = " start=\"" + str(start) + "\"" if start != 1 else ""
+        return "<" + tag + attr + ">\n" + "\n".join(out) + "\n</" + tag + ">", i
+
+    # retorna a lista de blocos (tipo, html)
+    def __blocks(self, lines: List[str], in_list: bool = False) -> List[Tuple[str, str]]:
+        out: List[Tuple[str, str]] = []
+        para: List[str] = []
+
+        def flush():
+            if len(para) > 0:
+                text = "\n".join(para).strip()
+                alone = Inline.image_re.fullmatch(text)
+                if alone is not None and alone.group(1) != "" and not in_list:
+                    img = Inline().render(text)
+                    out.append(("figure", "<figure>\n" + img + "\n<figcaption aria-hidden=\"true\">" +
+                                Inline().render(alone.group(1)) + "</figcaption>\n</figure>"))
+                else:
+                    out.append(("para", "<p>" + Inline().render(text) + "</p>"))
+                para.clear()
+
+        def interrupt():
+            if len(para) > 0:
+                raise Unsupported("block without blank line before: " + line)
+
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            if line.strip() == "":
+                flush()
+                i += 1
+                continue
+            if MdHtml.refdef_re.match(line):
+                raise Unsupported("reference link definition")
+            if len(para) > 0 and MdHtml.setext_re.match(line):
+                raise Unsupported("setext heading")
+            fence = MdHtml.fence_re.match(line)
+            if fence is not None:
+                interrupt()
+                mark = fence.group(2)
+                code: List[str] = []
+                i += 1
+                while i < len(lines) and not (lines[i].strip().startswith(mark) and lines[i].strip().strip(mark[0]) == ""):
+                    code.append(lines[i][len(fence.group(1)):] if lines[i].startswith(fence.group(1)) else lines[i].lstrip())
+                    i += 1
+                i += 1
+                lang = fence.group(3)
+                attr = " class=\"" + Inline.escape_attr(lang) + "\"" if lang != "" else ""
+                text = Inline.escape("\n".join(code))
+                out.append(("code", "<pre" + attr + "><code>" + text + "</code></pre>"))
+                continue
+            if MdHtml.__indent(line) >= 4 and len(para) == 0:
+                raise Unsupported("indented code block")
+            heading = MdHtml.heading_re.match(line)
+            if heading is not None:
+                interrupt()
+                level = str(len(heading.group(1)))
+                text = heading.group(2) or ""
+                out.append(("heading", "<h" + level + " id=\"" + self.__identifier(text) + "\">" +
+                            Inline().render(text) + "</h" + level + ">"))
+                i += 1
+                continue
+            if MdHtml.hr_re.match(line):
+                interrupt()
+                out.append(("hr", "<hr />"))
+                i += 1
+                continue
+            if line.lstrip().startswith("<!--"):
+                flush()
+                raw: List[str] = []
+                while i < len(lines):
+                    raw.append(lines[i])
+                    i += 1
+                    if "-->" in raw[-1]:
+                        break
+                out.append(("raw", "\n".join(raw)))
+                continue
+            if re.match(r"^ {0,3}</?[a-zA-Z]", line) and not Inline.autolink_re.match(line.lstrip()) and len(para) == 0:
+                raise Unsupported("raw html block")
+            if line.lstrip().startswith(">"):
+                interrupt()
+                quote: List[str] = []
+                while i < len(lines) and lines[i].lstrip().startswith(">"):
+                    quote.append(re.sub(r"^ {0,3}> ?", "", lines[i]))
+                    i += 1
+                inner = "\n".join(text for _, text in self.__blocks(quote))
+                out.append(("quote", "<blockquote>\n" + inner + "\n</blockquote>"))
+                continue
+            if MdHtml.item_re.match(line):
+                if not in_list:
+                    interrupt()
+                flush()
+                text, i = self.__list(lines, i)
+                out.append(("list", text))
+                continue
+            if "|" in line and i + 1 < len(lines) and MdHtml.table_sep_re.match(lines[i + 1]) and "-" in lines[i + 1]:
+                interrupt()
+                rows = [line, lines[i + 1]]
+                i += 2
+                while i < len(lines) and lines[i].strip() != "" and "|" in lines[i]:
+                    rows.append(lines[i])
+                    i += 1
+                out.append(("table", self.__table(rows)))
+                continue
+            para.append(line)
+            i += 1
+        flush()
+        return out
+
+    def render(self, content: str) -> str:
+        # o \x00 marca os trechos guardados pelo Inline; o pandoc também o troca por U+FFFD
+        lines = content.replace("\x00", "\ufffd").expandtabs(4).split("\n")
+        return "\n".join(text for _, text in self.__blocks(lines))
+
+    @staticmethod
+    def standalone(body: str, title: str, css: str, enable_latex: bool) -> str:
+        head = ["<!DOCTYPE html>",
+                "<html xmlns=\"http://www.w3.org/1999/xhtml\" lang=\"\" xml:lang=\"\">",
+                "<head>",
+                "  <meta charset=\"utf-8\" />",
+                "  <meta name=\"generator\" content=\"mdhtml\" />",
+                "  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0, user-scalable=yes\" />",
+                "  <title>" + Inline.escape(title) + "</title>",
+                "  <style>" + css + "</style>"]
+        if enable_latex:
+            head.append("  <script src=\"https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js\""
+                        " type=\"text/javascript\"></script>")
+        head += ["</head>", "<body>"]
+        return "\n".join(head) + "\n" + body + "\n</body>\n</html>\n"
+
+    @staticmethod
+    def convert(input_file: str, output_file: str, title: str, css: str, enable_latex: bool):
+        with open(input_file) as f:
+            body = MdHtml().render(f.read())
+        with open(output_file, "w") as f:
+            f.write(MdHtml.standalone(body, title, css, enable_latex))
+
+
+# Reduz o html a uma sequência de tags e textos comparáveis, ignorando o
+# realce de sintaxe e os atributos cosméticos que o pandoc adiciona
+class Normalizer(html.parser.HTMLParser):
+    kept_attrs = ["href", "src", "id", "alt"]
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tokens: List[str] = []
+        self.text = ""
+        self.pre = 0
+
+    def __flush(self):
+        text = " ".join(self.text.split())
+        if text != "":
+            self.tokens.append(text)
+        self.text = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "pre":
+            self.pre += 1
+        if tag in ["div", "span", "colgroup", "col"] or (self.pre > 0 and tag in ["a", "code"]):
+            return
+        self.__flush()
+        kept = [name + "=" + (value or "") for name, value in attrs if name in Normalizer.kept_attrs]
+        self.tokens.append("<" + tag + " ".join([""] + kept) + ">")
+
+    def handle_endtag(self, tag):
+        if tag == "pre":
+            self.pre -= 1
+        if tag in ["div", "span", "colgroup", "col"] or (self.pre > 0 and tag in ["a", "code"]):
+            return
+        self.__flush()
+        self.tokens.append("</" + tag + ">")
+
+    def handle_data(self, data):
+        self.text += data
+
+    @staticmethod
+    def tokenize(content: str) -> List[str]:
+        parser = Normalizer()
+        parser.feed(content)
+        parser.close()
+        parser.__flush()
+        return parser.tokens
+
+
+# tokens da saída do pandoc, guardados ao lado do arquivo em <nome>.tokens.json
+def tokens_file(path: str) -> str:
+    return os.path.splitext(path)[0] + ".tokens.json"
+
+def pandoc_tokens(path: str) -> List[str]:
+    output = subprocess.run(["pandoc", "--mathjax", "-f", "markdown", "-t", "html", path],
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    return Normalizer.tokenize(output.stdout)
+
+# grava os tokens do pandoc de cada arquivo, para conferir depois sem o pandoc
+def save_tokens(files: List[str]):
+    for path in files:
+        with open(tokens_file(path), "w") as f:
+            json.dump(pandoc_tokens(path), f, indent=1, ensure_ascii=False)
+            f.write("\n")
+        print("saved:", tokens_file(path))
+
+# compara a saída do renderizador com a do pandoc para cada Readme, um fallback conta
+# como falha; usa os tokens guardados em <nome>.tokens.json quando existem
+def compare(files: List[str]) -> bool:
+    ok = True
+    for path in files:
+        with open(path) as f:
+            content = f.read()
+        try:
+            ours = MdHtml().render(content)
+        except Unsupported as e:
+            print("fallback:", path, "(" + str(e) + ")")
+            ok = False
+            continue
+        if os.path.isfile(tokens_file(path)):
+            with open(tokens_file(path)) as f:
+                expected = json.load(f)
+        else:
+            expected = pandoc_tokens(path)
+        found = Normalizer.tokenize(ours)
+        if expected == found:
+            print("ok:", path)
+            continue
+        ok = False
+        index = next((i for i, (a, b) in enumerate(zip(expected, found)) if a != b), min(len(expected), len(found)))
+        print("diff:", path)
+        print("  pandoc:", expected[index:index + 3])
+        print("  mdhtml:", found[index:index + 3])
+    return ok
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Markdown to html renderer")
+    parser.add_argument("files", type=str, nargs="+", help="markdown files")
+    parser.add_argument("-o", "--output", type=str, help="output html file")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare the output against pandoc or against the saved NAME.tokens.json")
+    parser.add_argument("--save-tokens", action="store_true", help="save the pandoc tokens of each file in NAME.tokens.json")
+    args = parser.parse_args(argv)
+
+    if args.save_tokens:
+        save_tokens(args.files)
+        return
+    if args.compare:
+        if not compare(args.files):
+            sys.exit(1)
+        return
+
+    with open(args.files[0]) as f:
+        content = f.read()
+    title = content.split("\n")[0].lstrip("# ")
+    try:
+        body = MdHtml().render(content)
+    except Unsupported as e:
+        print("mdhtml: unsupported markdown in", args.files[0] + ":", str(e) + ", use pandoc for this file")
+        sys.exit(1)
+    page = MdHtml.standalone(body, title, "", True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(page)
+    else:
+        print(page, end="")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,131 +5,233 @@ import re
 import os
 import argparse
 import enum
-from typing import Optional, List, Tuple
-import subprocess
+from typing import Optional, List, Tuple, Dict, Set
+import io
+import contextlib
+import concurrent.futures
+import json
+import hashlib
+from fingerprint import Fingerprint, HookFiles
+from filter import Filter
 
 class Action(enum.Enum):
     RUN = 1
     CLEAN = 2
 
-class TocMaker:
-    @staticmethod
-    def __only_hashtags(x: str) -> bool:
-        return len(x) == x.count("#") and len(x) > 0
+# Trecho do Readme. Diretivas guardam a linha de abertura e a de fechamento,
+# blocos de texto e de código guardam as linhas originais
+class Block:
+    def __init__(self, kind: str, lines: List[str]):
+        self.kind = kind # text, fence, toc, toch, draft, load, save
+        self.lines = lines
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+class Document:
+    regions = ["toc", "toch", "draft"]
+    load_regex = re.compile(r"<!-- load (\S*?) (\S*?) -->$")
+    save_regex = re.compile(r"\[\]\(save\)\[\]\((.*?)\)$")
+
+    # caminhos das diretivas são relativos à pasta do Readme
+    def __init__(self, content: str, folder: str = "."):
+        self.folder = folder
+        self.blocks: List[Block] = []
+        self.headings: List[str] = []
+        self.__parse(content.split("\n"))
 
-    # generate md link for the text
     @staticmethod
-    def __get_md_link(title: Optional[str]) -> str:
-        if title is None:
-            return ""
-        title = title.lstrip(" #").rstrip()
-        title = title.lower()
-        out = ''
-        for c in title:
-            if c == ' ' or c == '-':
-                out += '-'
-            elif c == '_':
-                out += '_'
-            elif c.isalnum():
-                out += c
-        return out
+    def __is_heading(line: str) -> bool:
+        first = line.split(" ", 1)[0]
+        return len(first) > 0 and first.count("#") == len(first) and line.find("[]()") == -1
 
     @staticmethod
-    def __get_level(line: str) -> int:
-        return len(line.split(" ")[0])
+    def __find(lines: List[str], start: int, tag: str) -> int:
+        for j in range(start, len(lines)):
+            if lines[j].startswith(tag):
+                return j
+        return -1
 
+    # procura o fim do bloco de código aberto na linha i, -1 se não for fechado
     @staticmethod
-    def __get_content(line: str) -> str:
-        return " ".join(line.split(" ")[1:])
+    def __fence_end(lines: List[str], i: int) -> int:
+        if lines[i][3:].find("```") != -1:
+            return i
+        for j in range(i + 1, len(lines)):
+            if lines[j].find("```") != -1:
+                return j
+        return -1
+
+    # percorre as linhas uma única vez separando diretivas, códigos e títulos
+    def __parse(self, lines: List[str]):
+        text: List[str] = []
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            kind = ""
+            end = -1
+            if line.startswith("```"):
+                kind, end = "fence", Document.__fence_end(lines, i)
+                if end == -1:
+                    # como antes, as diretivas depois de um bloco sem fechamento continuam valendo
+                    print("warning: code block opened at line", i + 1, "is not closed")
+            elif line[5:-4] in Document.regions and line == "<!-- " + line[5:-4] + " -->":
+                kind, end = line[5:-4], Document.__find(lines, i + 1, line)
+            elif line.startswith("<!-- load ") and Document.load_regex.match(line):
+                kind, end = "load", Document.__find(lines, i + 1, "<!-- load -->")
+            elif line.startswith("[](save)") and Document.save_regex.match(line) and i + 1 < len(lines) \
+                    and re.match(r"```[a-z]*$", lines[i + 1]):
+                kind, end = "save", -1
+                for j in range(i + 2, len(lines) - 1):
+                    if lines[j].endswith("```") and lines[j + 1].startswith("[](save)"):
+                        end = j + 1
+                        break
+            if end == -1:
+                if Document.__is_heading(line):
+                    self.headings.append(line)
+                text.append(line)
+                i += 1
+                continue
+            if len(text) > 0:
+                self.blocks.append(Block("text", text))
+                text = []
+            block = Block(kind, lines[i:end + 1])
+            if kind == "load":
+                # títulos do conteúdo carregado fora de blocos de código também entram no toc
+                inner = block.lines[1:-1]
+                j = 0
+                while j < len(inner):
+                    close = Document.__fence_end(inner, j) if inner[j].startswith("```") else -1
+                    if close != -1:
+                        j = close + 1
+                        continue
+                    if Document.__is_heading(inner[j]):
+                        self.headings.append(inner[j])
+                    j += 1
+            self.blocks.append(block)
+            i = end + 1
+        if len(text) > 0 or len(self.blocks) == 0:
+            self.blocks.append(Block("text", text))
+
+    def resolve(self, path: str) -> str:
+        return os.path.normpath(os.path.join(self.folder, path))
+
+    def loads(self) -> List[Tuple[str, str]]:
+        output: List[Tuple[str, str]] = []
+        for block in self.blocks:
+            if block.kind == "load":
+                match = Document.load_regex.match(block.lines[0])
+                if match is not None:
+                    output.append((self.resolve(match.group(1)), match.group(2)))
+        return output
+
+    # lista de (caminho, conteúdo) dos blocos [](save)
+    def saves(self) -> List[Tuple[str, str]]:
+        output: List[Tuple[str, str]] = []
+        for block in self.blocks:
+            if block.kind == "save":
+                match = Document.save_regex.match(block.lines[0])
+                if match is not None:
+                    output.append((self.resolve(match.group(1)), "\n".join(block.lines[2:-1])[:-3]))
+        return output
 
+class TocMaker:
+    # generate md link for the text
     @staticmethod
-    def __remove_code_fences(content: str) -> str:
-        regex = r"^```.*?```\n"
-        return re.sub(regex, "", content, 0, re.MULTILINE | re.DOTALL)
+    def __get_md_link(title: Optional[str]) -> str:
+        if title is None:
+            return ""
+        title = title.lstrip(" #").rstrip().lower()
+        return "".join("-" if c == " " or c == "-" else c for c in title if c in " -_" or c.isalnum())
 
     # return List[level, "[text](link)"]
     @staticmethod
-    def __extract_entries(content: str) -> List[Tuple[int, str]]:
-        content = TocMaker.__remove_code_fences(content)
-
-        lines = content.split("\n")
-        disable_tag = "[]()"
-        lines = [line for line in lines if TocMaker.__only_hashtags(line.split(" ")[0]) and line.find(disable_tag) == -1]
-
+    def __extract_entries(headings: List[str]) -> List[Tuple[int, str]]:
         entries: List[Tuple[int, str]] = []
-        for line in lines:
-            level = TocMaker.__get_level(line)
-            text = "[" + TocMaker.__get_content(line) + "](#" + TocMaker.__get_md_link(line) + ")"
-            entries.append((level, text))
+        for line in headings:
+            parts = line.split(" ", 1)
+            level = len(parts[0])
+            content = parts[1] if len(parts) > 1 else ""
+            entries.append((level, "[" + content + "](#" + TocMaker.__get_md_link(line) + ")"))
         return entries
 
-    
     @staticmethod
-    def execute_toch(content: str) -> str:
-        entries = TocMaker.__extract_entries(content)
+    def execute_toch(headings: List[str]) -> str:
+        entries = TocMaker.__extract_entries(headings)
         links = [b for (a, b) in entries if a == 2]
         table = ["--" for _ in links]
         return " | ".join(links) + "\n" + " | ".join(table)
-        
 
     @staticmethod
-    def execute_toc(content: str) -> str:
-        entries = TocMaker.__extract_entries(content)
+    def execute_toc(headings: List[str]) -> str:
+        entries = TocMaker.__extract_entries(headings)
         toc_lines = ["  " * (level - 2) + "- " + link for (level, link) in entries if level > 1]
-        toc_text = "\n".join(toc_lines)
-        return toc_text
+        return "\n".join(toc_lines)
 
 class Toc:
     @staticmethod
-    def execute(content: str, action: Action = Action.RUN) -> str:
-        regex = r"<!-- toc -->\n" + r"(.*?)"+ r"<!-- toc -->"
+    def execute(doc: Document, block: Block, action: Action = Action.RUN) -> str:
         if action == Action.RUN:
-            new_toc = TocMaker.execute_toc(content)
-            subst = r"<!-- toc -->\n" + new_toc + r"\n<!-- toc -->"
-        else:
-            subst = r"<!-- toc -->\n<!-- toc -->"
-        return re.sub(regex, subst, content, 0, re.MULTILINE | re.DOTALL)
+            return "<!-- toc -->\n" + TocMaker.execute_toc(doc.headings) + "\n" + block.lines[-1]
+        return "<!-- toc -->\n" + block.lines[-1]
 
 class Toch:
     @staticmethod
-    def execute(content: str, action: Action = Action.RUN) -> str:
-        regex = r"<!-- toch -->\n" + r"(.*?)"+ r"<!-- toch -->"
+    def execute(doc: Document, block: Block, action: Action = Action.RUN) -> str:
         if action == Action.RUN:
-            new_toc = TocMaker.execute_toch(content)
-            subst = r"<!-- toch -->\n" + new_toc + r"\n<!-- toch -->"
-        else:
-            subst = r"<!-- toch -->\n<!-- toch -->"
-        return re.sub(regex, subst, content, 0, re.MULTILINE | re.DOTALL)
+            return "<!-- toch -->\n" + TocMaker.execute_toch(doc.headings) + "\n" + block.lines[-1]
+        return "<!-- toch -->\n" + block.lines[-1]
 
 class Drafts:
 
     @staticmethod
     def load_drafts(readme_path):
         folder = os.path.dirname(readme_path)
-        origin = os.path.join(folder, "src")
-        output = ""
-        if os.path.isdir(origin):
+        # dentro do mbuild, a pasta já foi varrida
+        files = HookFiles.find(folder)
+        if files is not None:
+            origin, isdir, listdir = "src", files.isdir, files.listdir
+        else:
+            origin, isdir, listdir = os.path.join(folder, "src"), os.path.isdir, os.listdir
+        output = []
+        if isdir(origin):
             # create a markdown list os links with all files under .cache/src
-            entries = sorted(os.listdir(origin))
+            entries = sorted(listdir(origin))
             for lang in entries:
-                output += "- " + lang + "\n"
-                for file in sorted(os.listdir(os.path.join(origin, lang))):
-                    output += "  - [" + file + "](.cache/lang/" + lang + "/" + file + ")\n"
-
-        return output
+                output.append("- " + lang + "\n")
+                for file in sorted(listdir(os.path.join(origin, lang))):
+                    output.append("  - [" + file + "](.cache/lang/" + lang + "/" + file + ")\n")
 
+        return "".join(output)
 
     @staticmethod
-    def execute(path, content: str, action: Action = Action.RUN) -> str:
-        regex = r"<!-- draft -->\n(.*?)<!-- draft -->"
+    def execute(path, block: Block, action: Action = Action.RUN) -> str:
         if action == Action.RUN:
-            new_draft = Drafts.load_drafts(path)
-            subst = r"<!-- draft -->\n" + new_draft + r"\n<!-- draft -->"
-        else:
-            subst = r"<!-- draft -->\n<!-- draft -->"
-        return re.sub(regex, subst, content, 0, re.MULTILINE | re.DOTALL)
+            return "<!-- draft -->\n" + Drafts.load_drafts(path) + "\n" + block.lines[-1]
+        return "<!-- draft -->\n" + block.lines[-1]
 
 class Load:
+    # saída do filter já calculada por caminho, só para a versão mais recente do arquivo: (hash, saída)
+    filtered: Dict[str, Tuple[str, str]] = {}
+
+    @staticmethod
+    def read(path: str) -> Tuple[str, str]:
+        with open(path, "rb") as f:
+            data = f.read()
+        # mesma conversão de fim de linha da leitura em modo texto
+        text = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+        return hashlib.sha1(data).hexdigest(), text
+
+    @staticmethod
+    def filter(path: str) -> str:
+        digest, content = Load.read(path)
+        key = os.path.abspath(path)
+        cached = Load.filtered.get(key)
+        if cached is None or cached[0] != digest:
+            # mesma saída do executável filter, que imprime o resultado com print
+            cached = (digest, Filter(path).process(content) + "\n")
+            Load.filtered[key] = cached
+        return cached[1]
 
     @staticmethod
     def extract_between_tags(content, tag):
@@ -140,86 +242,60 @@ class Load:
         return ""
 
     @staticmethod
-    def execute(content: str, action: Action = Action.RUN) -> str:
-        new_content = ""
-        last = 0
+    def execute(doc: Document, block: Block, action: Action = Action.RUN) -> str:
+        match = Document.load_regex.match(block.lines[0])
+        assert match is not None
+        path = match.group(1)
+        tags = match.group(2)
+        words: List[str] = tags.split(":")
 
-        regex = r"<!-- load (\S*?) (\S*?) -->\n(.*?)<!-- load -->"
-        matches = re.finditer(regex, content, re.MULTILINE | re.DOTALL)
-        
-        for match in matches:
-            path = match.group(1)
-            tags = match.group(2)
-            words: List[str] = tags.split(":")
-
-            fenced: List[str] = [tag for tag in words if tag.startswith("fenced")]
-            words = [tag for tag in words if not tag.startswith("fenced")]
-
-            filter: List[str] = [tag for tag in words if tag.startswith("filter")]
-            words = [tag for tag in words if not tag.startswith("filter")]
-
-            extract: List[str] = [tag for tag in words if tag.startswith("extract")]
-            words = [tag for tag in words if not tag.startswith("extract")]
-
-
-            ext = os.path.splitext(path)[1][1:]
-            if len(words) > 0:
-                ext = words[0]
-            if len(fenced) == 1:
-                parts = fenced[0].split("=")
-                if len(parts) == 2:
-                    ext = parts[1]
-
-
-            new_content += content[last:match.start()] # inserindo texto entre matches
-            last = match.end()
-            # new_content += "[](load)[](" + path + ")[](" + tags + ")\n"
-            new_content += "<!-- load " + path + " " + tags + " -->\n"
-
-            # se não for run, deve limpar o conteúdo não inserindo os arquivos
-            if action == Action.RUN:
-                if len(fenced) > 0:
-                    new_content += "\n```" + ext + "\n"
-                if os.path.isfile(path):
-                    if len(filter) > 0:
-                        output = subprocess.run(["filter", path], stdout=subprocess.PIPE)
-                        data = output.stdout.decode("utf-8")
-                        new_content += data
-                        if data[-1] != "\n":
-                            new_content += "\n"
-                    elif len(extract) > 0:
-                        tag = extract[0].split("=")[1]
-                        data = Load.extract_between_tags(open(path).read(), tag)
-                        new_content += data
-                        if len(data) == 0 or data[-1] != "\n":
-                            new_content += "\n"
-                    else:
-                        data = open(path).read()
-                        new_content += open(path).read()
-                        if data[-1] != "\n":
-                            new_content += "\n"
-                else:
-                    print("warning: file", path, "not found")
-                if fenced:
-                    new_content += "```\n\n"
-            new_content += "<!-- load -->"
-        
-        new_content += content[last:]
-        return new_content
+        fenced: List[str] = [tag for tag in words if tag.startswith("fenced")]
+        words = [tag for tag in words if not tag.startswith("fenced")]
 
+        filter: List[str] = [tag for tag in words if tag.startswith("filter")]
+        words = [tag for tag in words if not tag.startswith("filter")]
 
-            
+        extract: List[str] = [tag for tag in words if tag.startswith("extract")]
+        words = [tag for tag in words if not tag.startswith("extract")]
+
+        ext = os.path.splitext(path)[1][1:]
+        if len(words) > 0:
+            ext = words[0]
+        if len(fenced) == 1:
+            parts = fenced[0].split("=")
+            if len(parts) == 2:
+                ext = parts[1]
+
+        new_content = ["<!-- load " + path + " " + tags + " -->\n"]
+
+        # se não for run, deve limpar o conteúdo não inserindo os arquivos
+        if action == Action.RUN:
+            if len(fenced) > 0:
+                new_content.append("\n```" + ext + "\n")
+            source = doc.resolve(path)
+            if os.path.isfile(source):
+                if len(filter) > 0:
+                    data = Load.filter(source)
+                elif len(extract) > 0:
+                    tag = extract[0].split("=")[1]
+                    data = Load.extract_between_tags(Load.read(source)[1], tag)
+                else:
+                    data = Load.read(source)[1]
+                new_content.append(data)
+                if len(data) == 0 or data[-1] != "\n":
+                    new_content.append("\n")
+            else:
+                print("warning: file", source, "not found")
+            if fenced:
+                new_content.append("```\n\n")
+        new_content.append(block.lines[-1])
+        return "".join(new_content)
 
 class Save:
     @staticmethod
     # execute filename and content
-    def execute(file_content):
-        regex = r"\[\]\(save\)\[\]\((.*?)\)\n```[a-z]*\n(.*?)```\n\[\]\(save\)"
-        matches = re.finditer(regex, file_content, re.MULTILINE | re.DOTALL)
-        
-        for match in matches:
-            path = match.group(1)
-            content = match.group(2)
+    def execute(saves: List[Tuple[str, str]]):
+        for path, content in saves:
             exists = os.path.isfile(path)
             if exists:
                 content_old = open(path).read()
@@ -228,6 +304,77 @@ class Save:
                     print("file", path, "updated")
                     f.write(content)
 
+# Guarda, para cada Readme, os arquivos de que ele depende e seus hashes
+# em <pasta>/.cache/mdpp.json, para não reprocessar Readmes sem mudanças
+class DepCache:
+    @staticmethod
+    def cache_file(path: str) -> str:
+        return os.path.join(os.path.dirname(path), ".cache", "mdpp.json")
+
+    # arquivos carregados e arquivos salvos pelo Readme, em caminhos absolutos
+    @staticmethod
+    def dependencies(doc: Document) -> List[str]:
+        files = [path for path, _ in doc.loads()] + [path for path, _ in doc.saves()]
+        return sorted(set(os.path.abspath(f) for f in files))
+
+    # arquivos carregados, tomados antes do render para que um save do mesmo
+    # processamento não os marque como atualizados
+    @staticmethod
+    def read(doc: Document) -> Dict[str, List]:
+        return Fingerprint.collect(sorted(set(os.path.abspath(path) for path, _ in doc.loads())), {})
+
+    @staticmethod
+    def drafts_hash(path: str) -> str:
+        return hashlib.sha1(Drafts.load_drafts(path).encode()).hexdigest()
+
+    @staticmethod
+    def load(path: str) -> Dict:
+        cache_file = DepCache.cache_file(path)
+        if os.path.isfile(cache_file):
+            try:
+                with open(cache_file) as f:
+                    return json.load(f).get(os.path.basename(path), {})
+            except ValueError:
+                pass
+        return {}
+
+    @staticmethod
+    def is_fresh(path: str) -> bool:
+        record = DepCache.load(path)
+        if len(record) == 0 or not os.path.isfile(path):
+            return False
+        if Fingerprint.entry(path, record["readme"])[2] != record["readme"][2]:
+            return False
+        files = Fingerprint.collect(record["deps"], record["files"])
+        if Fingerprint.changed(files, record["files"]) is not None:
+            return False
+        return DepCache.drafts_hash(path) == record["drafts"]
+
+    @staticmethod
+    def save(path: str, doc: Document, read: Dict[str, List]):
+        cache_file = DepCache.cache_file(path)
+        data: Dict[str, Dict] = {}
+        if os.path.isfile(cache_file):
+            try:
+                with open(cache_file) as f:
+                    data = json.load(f)
+            except ValueError:
+                pass
+        deps = DepCache.dependencies(doc)
+        loaded = set(os.path.abspath(f) for f, _ in doc.loads())
+        files = Fingerprint.collect([f for f in deps if f not in loaded], {})
+        files.update(read)
+        data[os.path.basename(path)] = {
+            "readme": Fingerprint.entry(path),
+            "deps": deps,
+            "files": files,
+            "drafts": DepCache.drafts_hash(path)
+        }
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        with open(cache_file, "w") as f:
+            json.dump(data, f, indent=1)
+
 class Main:
     @staticmethod
     def fix_path(target):
@@ -249,37 +396,103 @@ class Main:
         print("Warning: File", path, "not found")
         return False, "" 
     
-def main():
+# aplica todas as diretivas sobre o modelo de blocos do Readme
+def render(path: str, doc: Document, action: Action) -> str:
+    output: List[str] = []
+    for block in doc.blocks:
+        if block.kind == "toc":
+            output.append(Toc.execute(doc, block, action))
+        elif block.kind == "toch":
+            output.append(Toch.execute(doc, block, action))
+        elif block.kind == "load":
+            output.append(Load.execute(doc, block, action))
+        elif block.kind == "draft":
+            output.append(Drafts.execute(path, block, action))
+        else:
+            output.append(block.text())
+    return "\n".join(output)
+
+# resultado do processamento de um Readme, ainda sem escrever nada no disco
+class Result:
+    def __init__(self, path: str, original: str, updated: str, doc: Document, messages: str,
+                 read: Optional[Dict[str, List]] = None):
+        self.path = path
+        self.original = original
+        self.updated = updated
+        self.doc = doc
+        self.messages = messages
+        self.read: Dict[str, List] = read if read is not None else {}
+
+def prepare(target: str, action: Action) -> Optional[Result]:
+    path, folder = Main.fix_path(target)
+    if action == Action.RUN and DepCache.is_fresh(path):
+        return None
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        result, original = Main.open_file(path)
+        if not result:
+            return Result(path, "", "", Document(""), messages.getvalue())
+        doc = Document(original, folder)
+        read = DepCache.read(doc)
+        updated = render(path, doc, action)
+    return Result(path, original, updated, doc, messages.getvalue(), read)
+
+# escreve o Readme e os arquivos salvos, exceto os que estão em conflito
+def commit(result: Result, action: Action, conflicts: Set[str]):
+    print(result.messages, end="")
+    if result.updated == "" and result.original == "":
+        return
+    Save.execute([(path, content) for path, content in result.doc.saves() if os.path.abspath(path) not in conflicts])
+
+    if result.updated != result.original:
+        with open(result.path, "w") as f:
+            f.write(result.updated)
+            hook = os.path.abspath(result.path).split(os.sep)[-2]
+            print(hook + " : mdpp updading")
+    if action == Action.RUN:
+        DepCache.save(result.path, result.doc, result.read)
+
+# arquivos salvos por mais de um Readme
+def find_conflicts(results: List[Result]) -> Set[str]:
+    owners: Dict[str, List[str]] = {}
+    for result in results:
+        for path, _ in result.doc.saves():
+            readmes = owners.setdefault(os.path.abspath(path), [])
+            if result.path not in readmes:
+                readmes.append(result.path)
+    conflicts = set()
+    for path in sorted(owners):
+        if len(owners[path]) > 1:
+            print("conflict:", path, "saved by", " ".join(owners[path]))
+            conflicts.add(path)
+    return conflicts
+
+def process(targets: List[str], action: Action, jobs: int = 1) -> int:
+    if jobs <= 1:
+        results = [prepare(target, action) for target in targets]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            results = list(pool.map(prepare, targets, [action] * len(targets)))
+    ready = [result for result in results if result is not None]
+    conflicts = find_conflicts(ready)
+    for result in ready:
+        commit(result, action, conflicts)
+    return len(ready)
+
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser()
     parser.add_argument('targets', metavar='T', type=str, nargs='*', help='Readmes or folders')
     parser.add_argument('--quiet', '-q', action="store_true", help='quiet mode')
     parser.add_argument('--clean', '-c', action="store_true", help='clean mode')
-    args = parser.parse_args()
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='number of parallel workers')
+    args = parser.parse_args(argv)
 
     if len(args.targets) == 0:
         args.targets.append(".")
     
     action = Action.RUN if not args.clean else Action.CLEAN
 
-    for target in args.targets:
-        path, folder = Main.fix_path(target)
-        result, original = Main.open_file(path)
-        if not result:
-            continue
-        updated = original
-        updated_toc = Toc.execute(updated, action)
-        updated_toc = Toch.execute(updated_toc, action)
-        if updated != updated_toc:
-            updated = updated_toc
-        updated = Load.execute(updated, action)
-        updated = Drafts.execute(target, updated, action)
-        Save.execute(updated)
-        
-        if updated != original:
-            with open(path, "w") as f:
-                f.write(updated)
-                hook = os.path.abspath(path).split(os.sep)[-2]
-                print(hook + " : mdpp updading")
+    process(args.targets, action, args.jobs)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Situação de todos os hooks da base sem rodar mdpp nem build:
+# uma única varredura da base comparada com o .cache/manifest.json de cada hook
+#   up to date  entradas iguais às do último build
+#   stale       alguma entrada de alguma etapa mudou, foi criada ou removida; mostra a mais recente
+#   missing     falta alguma saída das etapas
+
+import os
+import sys
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+from fingerprint import Fingerprint, Snapshot
+from mbuild import Action, Manifest
+
+class HookStatus:
+    def __init__(self, hook: str, state: str, path: str = ""):
+        self.hook = hook
+        self.state = state
+        self.path = path
+
+
+class Status:
+    def __init__(self, base: str, confirm: bool = False):
+        self.base = base
+        self.confirm = confirm # confirma pelo sha1 os arquivos com tamanho ou mtime diferentes
+        self.stats: Dict[str, Optional[Tuple[int, int]]] = {}
+        self.files: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self.hashes: Dict[str, str] = {}
+
+    # agrupa a varredura da base por hook, com caminhos relativos ao hook
+    def walk(self):
+        for path, value in Snapshot.take(self.base).items():
+            hook, _, rest = path.partition(os.sep)
+            if rest != "":
+                self.files.setdefault(hook, {})[rest] = value
+
+    # arquivos fora da varredura (.cache, remote.cfg), cada um lido uma única vez
+    def stat(self, path: str) -> Optional[Tuple[int, int]]:
+        path = os.path.normpath(path)
+        if path not in self.stats:
+            try:
+                st = os.stat(path)
+                self.stats[path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                self.stats[path] = None
+        return self.stats[path]
+
+    def hash(self, path: str) -> str:
+        if path not in self.hashes:
+            self.hashes[path] = Fingerprint.file_hash(path)
+        return self.hashes[path]
+
+    def check(self, hook: str) -> HookStatus:
+        folder = os.path.join(self.base, hook)
+        files = self.files[hook]
+        outputs = Action.outputs(folder)
+        for output in sum(outputs.values(), []):
+            if self.stat(os.path.join(folder, output)) is None:
+                return HookStatus(hook, "missing", output)
+        stages = Manifest.load(os.path.join(folder, ".cache", "manifest.json")).get("stages", {})
+        if any(name not in stages for name in outputs):
+            return HookStatus(hook, "missing", os.path.join(".cache", "manifest.json"))
+
+        # cada etapa contra o próprio registro, como no Action.is_dirty: o mesmo arquivo
+        # pode estar atualizado no registro de uma etapa e antigo no de outra
+        changed: List[Tuple[int, str]] = []
+        recorded = set()
+        for entries in stages.values():
+            for path, entry in entries.items():
+                recorded.add(path)
+                value = files.get(path) if path in files else self.stat(os.path.join(folder, path))
+                if value is None:
+                    changed.append((sys.maxsize, path))
+                elif value != (entry[0], entry[1]):
+                    if not self.confirm or self.hash(os.path.join(folder, path)) != entry[2]:
+                        changed.append((value[1], path))
+        for path, value in files.items():
+            if path not in recorded and Manifest.is_input(path):
+                changed.append((value[1], path))
+        if len(changed) > 0:
+            return HookStatus(hook, "stale", max(changed)[1])
+        return HookStatus(hook, "up to date")
+
+    def run(self) -> List[HookStatus]:
+        self.walk()
+        hooks = sorted(hook for hook, files in self.files.items() if "Readme.md" in files)
+        return [self.check(hook) for hook in hooks]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Show which hooks need a rebuild, without building")
+    parser.add_argument("base", type=str, nargs="?", default="base", help="base folder with the hooks")
+    parser.add_argument("--hash", action="store_true", help="confirm by sha1 the files whose size or mtime changed")
+    parser.add_argument("--quiet", "-q", action="store_true", help="print only the hooks that need a rebuild")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.base):
+        print("error:", args.base, "is not a folder")
+        sys.exit(1)
+    result = Status(args.base, args.hash).run()
+    counts = {"up to date": 0, "stale": 0, "missing": 0}
+    for item in result:
+        counts[item.state] += 1
+        if not args.quiet or item.state != "up to date":
+            print(("%-10s %s %s" % (item.state, item.hook, item.path)).rstrip())
+    print("Hooks:", len(result), "Up to date:", counts["up to date"], "Stale:", counts["stale"],
+          "Missing:", counts["missing"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+from mbuild import CaseParser, Unit
+
+
+def unit(case: str, input: str, output: str, grade=None) -> Unit:
+    result = Unit(case)
+    result.input = input
+    result.output = output
+    result.grade = grade
+    return result
+
+
+def fields(units):
+    return [(u.case, u.input, u.output, u.grade) for u in units]
+
+
+units = [unit("a", "1\n", "2\n"), unit("b", "3\n4\n", "7\n\n", 50), unit("c", "", "")]
+
+
+def test_vpl_round_trip():
+    text = "".join(u.to_vpl() + "\n" for u in units)
+    assert fields(CaseParser.parse_vpl(text.splitlines(keepends=True))) == fields(units)
+
+
+def test_tio_round_trip():
+    text = "".join(u.to_tio() + "\n" for u in units)
+    assert fields(CaseParser.parse_tio(text.splitlines(keepends=True))) == fields(units)
+
+
+def test_vpl_cases_separated_by_blank_lines():
+    text = 'case=a\ninput=1\noutput="2\n"\n\ncase=b\ninput=3\noutput=4\n\n\ncase=c\ninput=5\noutput="6\n"\n'
+    parsed = list(CaseParser.parse_vpl(text.splitlines(keepends=True)))
+    assert [(u.case, u.input, u.output) for u in parsed] == [("a", "1\n", "2\n"), ("b", "3\n", "4\n"),
+                                                            ("c", "5\n", "6\n")]
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from filter import Batch, Filter
+from mbuild import Tree
+
+
+def write(path, text: str):
+    os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+    with open(str(path), "w") as f:
+        f.write(text)
+
+
+def test_plan_rejects_inputs_with_the_same_output(tmp_path):
+    write(tmp_path / "a" / "x.cpp", "int a;\n")
+    write(tmp_path / "b" / "x.cpp", "int b;\n")
+    with pytest.raises(ValueError):
+        Batch.plan([str(tmp_path / "a" / "x.cpp"), str(tmp_path / "b" / "x.cpp")], str(tmp_path / "out"))
+    assert not os.path.exists(tmp_path / "out")
+
+
+def test_plan_accepts_the_same_input_twice(tmp_path):
+    write(tmp_path / "a" / "x.cpp", "int a;\n")
+    path = str(tmp_path / "a" / "x.cpp")
+    assert len(Batch.plan([path, path], str(tmp_path / "out"))) == 1
+
+
+
+# as marcações dos arquivos .hs existentes usam //
+def test_haskell_markers_use_slashes(tmp_path):
+    content = "main = do\n//++1\n    print 1\n//--\n    print 2"
+    write(tmp_path / "main.hs", content)
+    assert not Tree.is_plain(str(tmp_path / "main.hs"))
+    assert Filter(str(tmp_path / "main.hs")).process(content) == "main = do\n    print 1"
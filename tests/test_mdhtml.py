@@ -0,0 +1,46 @@
+import os
+import glob
+
+import pytest
+
+import mdhtml
+
+corpus = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+# cada Readme do corpus contra os tokens do pandoc guardados em <nome>.tokens.json
+def test_corpus_matches_pandoc():
+    files = sorted(glob.glob(os.path.join(corpus, "*.md")))
+    assert len(files) > 0
+    assert all(os.path.isfile(mdhtml.tokens_file(path)) for path in files)
+    assert mdhtml.compare(files)
+
+
+def test_blank_line_before_another_list_keeps_list_tight():
+    html = mdhtml.MdHtml().render("- a\n- b\n\n1. x")
+    assert html == "<ul>\n<li>a</li>\n<li>b</li>\n</ul>\n<ol>\n<li>x</li>\n</ol>"
+
+
+def test_blank_line_between_items_makes_list_loose():
+    html = mdhtml.MdHtml().render("- a\n\n- b")
+    assert html == "<ul>\n<li><p>a</p></li>\n<li><p>b</p></li>\n</ul>"
+
+
+def test_main_reports_unsupported(tmp_path, capsys):
+    path = tmp_path / "Readme.md"
+    path.write_text("texto\n- item\n")
+    with pytest.raises(SystemExit) as error:
+        mdhtml.main([str(path)])
+    assert error.value.code == 1
+    assert "unsupported markdown" in capsys.readouterr().out
+
+
+def test_nul_is_replaced_like_pandoc():
+    assert mdhtml.MdHtml().render("a\x00b") == "<p>a�b</p>"
+    assert mdhtml.MdHtml().render("\x001\x00") == "<p>�1�</p>"
+
+
+def test_compare_fails_on_fallback(tmp_path):
+    path = tmp_path / "Readme.md"
+    path.write_text("texto\n- item\n")
+    assert not mdhtml.compare([str(path)])
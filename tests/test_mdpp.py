@@ -0,0 +1,43 @@
+import mdpp
+from fingerprint import HookFiles
+
+
+# o watch roda por horas: cada arquivo carregado guarda só a saída da versão atual
+def test_filtered_keeps_only_latest_version(tmp_path):
+    mdpp.Load.filtered.clear()
+    path = tmp_path / "main.cpp"
+    for i in range(5):
+        path.write_text("int x = %d;\n" % i)
+        assert mdpp.Load.filter(str(path)) == "int x = %d;\n\n" % i
+    assert len(mdpp.Load.filtered) == 1
+
+
+# a lista de rascunhos é a mesma dentro do mbuild (varredura compartilhada) e no mdpp sozinho
+def test_drafts_same_with_shared_scan(tmp_path):
+    for name in ["src/cpp/main.cpp", "src/py/main.py", "src/.vscode/settings.json", "src/cpp/.hidden"]:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x\n")
+    readme = str(tmp_path / "Readme.md")
+    alone = mdpp.Drafts.load_drafts(readme)
+    with HookFiles(str(tmp_path)).shared():
+        shared = mdpp.Drafts.load_drafts(readme)
+    assert ".vscode" in alone
+    assert shared == alone
+
+
+# um Readme que carrega um arquivo salvo por ele mesmo é atualizado na rodada seguinte
+def test_load_of_saved_file_fills_on_next_run(tmp_path):
+    readme = tmp_path / "Readme.md"
+    readme.write_text("[](save)[](out.txt)\n```txt\nhello\n```\n[](save)\n\n<!-- load out.txt txt -->\n<!-- load -->\n")
+    for _ in range(3):
+        mdpp.process([str(readme)], mdpp.Action.RUN)
+    assert "<!-- load out.txt txt -->\nhello\n<!-- load -->" in readme.read_text()
+
+
+# um bloco de código sem fechamento não esconde as diretivas seguintes
+def test_unclosed_fence_keeps_directives(capsys):
+    doc = mdpp.Document("```py\nx = 1\n<!-- toc -->\n<!-- toc -->\n## Title")
+    assert [block.kind for block in doc.blocks] == ["text", "toc", "text"]
+    assert doc.headings == ["## Title"]
+    assert "not closed" in capsys.readouterr().out
@@ -0,0 +1,56 @@
+from mbuild import Remote
+
+view = "https://github.com/user/repo/blob/master/base/h1/"
+raw = "https://raw.githubusercontent.com/user/repo/master/base/h1/"
+folder = "https://github.com/user/repo/tree/master/base/h1/"
+
+
+def rewrite(content: str) -> str:
+    return Remote.replace_remote(content, "user", "repo", "base/h1")
+
+
+def test_local_links_and_images():
+    assert rewrite("[main](main.cpp)") == "[main](" + view + "main.cpp)"
+    assert rewrite("![](img/a.png)") == "![](" + raw + "img/a.png)"
+    assert rewrite("[src](src/)") == "[src](" + folder + "src)"
+
+
+def test_anchors_and_absolute_urls_are_kept():
+    content = "[a](#intro) [b](https://x.com/a.md) [c](<a b.md>) [d](mailto:a@b.c)"
+    assert rewrite(content) == content
+
+
+def test_fragment_and_title():
+    assert rewrite("[a](doc.md#part)") == "[a](" + view + "doc.md#part)"
+    assert rewrite("[a](doc.md \"Título\")") == "[a](" + view + "doc.md \"Título\")"
+    assert rewrite("![a](a.png#x 'img')") == "![a](" + raw + "a.png#x 'img')"
+
+
+def test_links_inside_link_text():
+    assert rewrite("[![a](a.png)](main.cpp)") == "[![a](" + raw + "a.png)](" + view + "main.cpp)"
+
+
+def test_code_spans_are_kept():
+    content = "`[a](b.md)` e ``x ` [a](b.md)``"
+    assert rewrite(content) == content
+    assert rewrite("[`a]`](b.md)") == "[`a]`](" + view + "b.md)"
+
+
+def test_fenced_blocks_are_kept():
+    for fence in ["```", "~~~", "````"]:
+        content = fence + "\n[a](b.md)\n" + fence + "\n[a](b.md)"
+        assert rewrite(content) == fence + "\n[a](b.md)\n" + fence + "\n[a](" + view + "b.md)"
+    # um ``` dentro de um bloco ~~~ não fecha o bloco
+    content = "~~~\n```\n[a](b.md)\n~~~"
+    assert rewrite(content) == content
+
+
+def test_escaped_brackets():
+    content = "\\[a](b.md) e [a\\](b.md)"
+    assert rewrite(content) == content
+    assert rewrite("[a\\]b](c.md)") == "[a\\]b](" + view + "c.md)"
+
+
+def test_empty_text_links_are_kept():
+    assert rewrite("[](save)[](out.txt)") == "[](save)[](out.txt)"
+    assert rewrite("![](a.png)") == "![](" + raw + "a.png)"
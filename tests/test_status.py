@@ -0,0 +1,52 @@
+import os
+import json
+
+from fingerprint import Fingerprint
+from mbuild import Action
+from status import Status
+
+
+# hook com todas as saídas e um manifesto em que todas as etapas registram o Readme atual
+def make_hook(base) -> str:
+    folder = os.path.join(str(base), "h1")
+    os.makedirs(os.path.join(folder, ".cache"))
+    with open(os.path.join(folder, "Readme.md"), "w") as f:
+        f.write("# Title\n")
+    for output in sum(Action.outputs(folder).values(), []):
+        with open(os.path.join(folder, output), "w") as f:
+            f.write("x\n")
+    entry = Fingerprint.entry(os.path.join(folder, "Readme.md"))
+    stages = {name: {"Readme.md": entry} for name in Action.outputs(folder)}
+    with open(os.path.join(folder, ".cache", "manifest.json"), "w") as f:
+        json.dump({"stages": stages}, f)
+    return folder
+
+
+def test_up_to_date(tmp_path):
+    make_hook(tmp_path)
+    assert [item.state for item in Status(str(tmp_path)).run()] == ["up to date"]
+
+
+# o registro antigo de uma etapa não fica escondido pelo registro novo de outra
+def test_stale_record_of_one_stage(tmp_path):
+    folder = make_hook(tmp_path)
+    manifest = os.path.join(folder, ".cache", "manifest.json")
+    with open(manifest) as f:
+        data = json.load(f)
+    data["stages"]["cases"]["Readme.md"] = [1, 1, "0" * 40]
+    with open(manifest, "w") as f:
+        json.dump(data, f)
+    for confirm in [False, True]:
+        result = Status(str(tmp_path), confirm).run()
+        assert [(item.state, item.path) for item in result] == [("stale", "Readme.md")]
+
+
+def test_missing_stage_record(tmp_path):
+    folder = make_hook(tmp_path)
+    manifest = os.path.join(folder, ".cache", "manifest.json")
+    with open(manifest) as f:
+        data = json.load(f)
+    del data["stages"]["mapi"]
+    with open(manifest, "w") as f:
+        json.dump(data, f)
+    assert [item.state for item in Status(str(tmp_path)).run()] == ["missing"]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# Medição das etapas do build: tempo de parede, cpu do processo, cpu dos
+# subprocessos e bytes lidos/escritos (/proc/self/io), gravados como eventos
+# no formato trace-event do Chrome (chrome://tracing, Perfetto)
+
+import os
+import time
+import json
+import cProfile
+import contextlib
+from typing import Dict, List, Optional, Tuple, Iterator
+
+class Profiler:
+    enabled = False
+    cprofile: Optional[str] = None # nome da etapa executada dentro do cProfile
+    events: List[Dict] = []
+
+    # bytes lidos e escritos pelo processo, inclusive pipes; (0, 0) fora do linux
+    @staticmethod
+    def io() -> Tuple[int, int]:
+        try:
+            with open("/proc/self/io") as f:
+                values = dict(line.split(": ") for line in f.read().splitlines())
+            return int(values["rchar"]), int(values["wchar"])
+        except (OSError, KeyError, ValueError):
+            return 0, 0
+
+    @staticmethod
+    def child_time() -> float:
+        times = os.times()
+        return times.children_user + times.children_system
+
+    # mede o trecho como um evento; com prof_file, roda também sob o cProfile
+    @staticmethod
+    @contextlib.contextmanager
+    def span(name: str, cat: str, hook: str, prof_file: Optional[str] = None) -> Iterator[None]:
+        if not Profiler.enabled:
+            yield
+            return
+        profile = cProfile.Profile() if prof_file is not None else None
+        start_ts = time.time_ns() // 1000
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        child = Profiler.child_time()
+        read, write = Profiler.io()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(prof_file)
+            end_read, end_write = Profiler.io()
+            Profiler.events.append({
+                "name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": os.getpid(),
+                "ts": start_ts, "dur": int((time.perf_counter() - wall) * 1e6),
+                "args": {
+                    "hook": hook,
+                    "cpu_ms": round((time.process_time() - cpu) * 1000, 3),
+                    "child_ms": round((Profiler.child_time() - child) * 1000, 3),
+                    "read_bytes": end_read - read,
+                    "write_bytes": end_write - write,
+                },
+            })
+
+    # devolve e esquece os eventos coletados, para enviar de um worker ao processo principal
+    @staticmethod
+    def take() -> List[Dict]:
+        events = Profiler.events
+        Profiler.events = []
+        return events
+
+    @staticmethod
+    def save(path: str):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": Profiler.events, "displayTimeUnit": "ms"}, f)
+
+    @staticmethod
+    def __row(name: str, count: int, wall: float, args: Dict) -> str:
+        return "%-24s %5d %10.1f %10.1f %10.1f %12d %12d" % (name[:24], count, wall, args["cpu_ms"], args["child_ms"],
+                                                            args["read_bytes"], args["write_bytes"])
+
+    # hooks mais lentos e totais por etapa, em ordem decrescente de tempo de parede
+    @staticmethod
+    def summary(top: int = 10) -> str:
+        header = "%-24s %5s %10s %10s %10s %12s %12s" % ("", "count", "wall_ms", "cpu_ms", "child_ms", "read", "written")
+        hooks = sorted([e for e in Profiler.events if e["cat"] == "hook"], key=lambda e: -e["dur"])
+        stages: Dict[str, List] = {}
+        for event in Profiler.events:
+            if event["cat"] != "stage":
+                continue
+            total = stages.setdefault(event["name"], [0, 0, {"cpu_ms": 0, "child_ms": 0, "read_bytes": 0, "write_bytes": 0}])
+            total[0] += 1
+            total[1] += event["dur"]
+            for key in total[2]:
+                total[2][key] += event["args"][key]
+
+        lines = ["Slowest hooks", header]
+        for event in hooks[:top]:
+            lines.append(Profiler.__row(event["name"], 1, event["dur"] / 1000, event["args"]))
+        lines += ["", "Stages", header]
+        for name, (count, dur, args) in sorted(stages.items(), key=lambda item: -item[1][1]):
+            lines.append(Profiler.__row(name, count, dur / 1000, args))
+        return "\n".join(lines)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Observa a pasta base e reconstrói apenas os hooks afetados pelos arquivos
+# alterados, mantendo mbuild e mdpp carregados no processo; dentro do hook o
+# mbuild refaz só as etapas cujas entradas mudaram
+
+import os
+import time
+import argparse
+from typing import Dict, List, Optional, Tuple, Set
+
+import mbuild
+import mdpp
+from fingerprint import Snapshot
+
+
+class Watch:
+    def __init__(self, base: str):
+        self.base = base
+        self.remote_cfg = os.path.normpath(os.path.join(base, "..", "remote.cfg"))
+        self.snapshot = Snapshot.take(base)
+        self.cfg_stat = Watch.__stat(self.remote_cfg)
+
+    @staticmethod
+    def __stat(path: str) -> Tuple[int, int]:
+        try:
+            st = os.stat(path)
+            return (st.st_size, st.st_mtime_ns)
+        except OSError:
+            return (0, 0)
+
+    # hooks com arquivos alterados; o mdpp pode reescrever o Readme a partir de
+    # qualquer arquivo, então o build checa todas as etapas do hook
+    def plan(self, changed: Set[str]) -> Set[str]:
+        output: Set[str] = set()
+        for path in changed:
+            pieces = path.split(os.sep, 1)
+            if len(pieces) < 2:
+                continue
+            if os.path.isfile(os.path.join(self.base, pieces[0], "Readme.md")):
+                output.add(pieces[0])
+        return output
+
+    def rebuild(self, hook: str):
+        folder = os.path.join(self.base, hook)
+        start = time.time()
+        try:
+            mdpp.process([folder], mdpp.Action.RUN)
+            built = mbuild.Action(folder).build(True, markdown=False)
+            if built:
+                print("   ", hook, "rebuilt in", "%.2fs" % (time.time() - start))
+        except (Exception, SystemExit) as e:
+            print("error:", hook, repr(e))
+
+    # espera até que uma leitura não traga alterações novas
+    def collect(self, interval: float, debounce: float) -> Set[str]:
+        changed: Set[str] = set()
+        quiet_since = time.time()
+        while True:
+            current = Snapshot.take(self.base)
+            cfg_stat = Watch.__stat(self.remote_cfg)
+            news = Snapshot.diff(self.snapshot, current)
+            self.snapshot = current
+            if cfg_stat != self.cfg_stat:
+                self.cfg_stat = cfg_stat
+                # o remote.cfg é usado pela etapa remote de todos os hooks
+                mbuild.RemoteCfg.cache.clear()
+                news |= set(os.path.join(hook, "Readme.md") for hook in os.listdir(self.base))
+            if len(news) > 0:
+                changed |= news
+                quiet_since = time.time()
+            elif len(changed) > 0 and time.time() - quiet_since >= debounce:
+                return changed
+            time.sleep(interval)
+
+    # entre os arquivos alterados durante o build de um hook, os que são entradas e não batem
+    # com o que o build registrou no manifesto: foram salvos depois de lidos pelo build
+    def unbuilt(self, hook: str, paths: Set[str], current: Dict[str, Tuple[int, int]]) -> Set[str]:
+        recorded = mbuild.Manifest.recorded(os.path.join(self.base, hook, ".cache", "manifest.json"))
+        output: Set[str] = set()
+        for path in paths:
+            inner = path.split(os.sep, 1)[1]
+            entry = recorded.get(inner)
+            if entry is None:
+                if path in current and mbuild.Manifest.is_input(inner):
+                    output.add(path)
+            elif current.get(path) != (entry[0], entry[1]):
+                output.add(path)
+        return output
+
+    def run(self, interval: float, debounce: float):
+        print("watching", self.base)
+        while True:
+            changed = self.collect(interval, debounce)
+            plan = self.plan(changed)
+            for hook in sorted(plan):
+                self.rebuild(hook)
+            # arquivos escritos pelo próprio build (Readme pelo mdpp, saídas do local.sh)
+            # não devem disparar outro build; entradas salvas durante o build e alterações
+            # em outros hooks continuam valendo para a próxima rodada
+            current = Snapshot.take(self.base)
+            during: Dict[str, Set[str]] = {}
+            pending: Set[str] = set()
+            for path in Snapshot.diff(self.snapshot, current):
+                hook = path.split(os.sep, 1)[0]
+                if hook in plan and os.sep in path:
+                    during.setdefault(hook, set()).add(path)
+                else:
+                    pending.add(path)
+            for hook, paths in during.items():
+                pending |= self.unbuilt(hook, paths, current)
+            for path in pending:
+                if path in self.snapshot:
+                    current[path] = self.snapshot[path]
+                else:
+                    del current[path]
+            self.snapshot = current
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Rebuild hooks when their files change")
+    parser.add_argument("base", type=str, nargs="?", default="base", help="base folder with the hooks")
+    parser.add_argument("--interval", "-i", type=float, default=0.2, help="polling interval in seconds")
+    parser.add_argument("--debounce", "-d", type=float, default=0.3, help="quiet time before rebuilding")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Prints the output of the commands")
+    parser.add_argument("--html", type=str, choices=["pandoc", "python"], default="pandoc", help="Html renderer")
+    args = parser.parse_args(argv)
+
+    mbuild.Log.verbose = args.verbose
+    mbuild.HTML.engine = args.html
+    try:
+        Watch(args.base).run(args.interval, args.debounce)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()